@@ -9,6 +9,7 @@ from dotenv import load_dotenv
 from routes.ocr_route import ocr_bp
 from routes.skip_planner_route import skip_planner_bp
 from routes.chat_route import chat_bp
+from utils import model_registry
 
 # Load environment variables
 load_dotenv()
@@ -33,6 +34,14 @@ CORS(app,
      allow_headers=["Content-Type", "Authorization"],
      max_age=timedelta(hours=1)
 )
+# Build the OCR reader and Gemini client before taking traffic
+if os.environ.get('WARMUP_ON_START', 'true').lower() == 'true':
+    model_registry.start_warm_up(
+        ping_gemini=os.environ.get('WARMUP_PING_GEMINI', 'false').lower() == 'true'
+    )
+else:
+    model_registry.mark_ready()
+
 # Register blueprints
 app.register_blueprint(ocr_bp, url_prefix='/api')
 app.register_blueprint(skip_planner_bp, url_prefix='/api')
@@ -46,6 +55,14 @@ def index():
         "message": "Bunker Baba Python API is running"
     })
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness endpoint, returns 503 until model warm-up has finished"""
+    status = model_registry.get_status()
+    if not status['ready']:
+        return jsonify({"status": "warming_up", **status}), 503
+    return jsonify({"status": "ready", **status})
+
 @app.errorhandler(404)
 def not_found(e):
     """Handle 404 errors"""
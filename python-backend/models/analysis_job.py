@@ -0,0 +1,131 @@
+from typing import Any, Dict, Optional
+from pymongo import MongoClient
+import os
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Statuses a job can no longer move out of
+FINISHED_STATUSES = ('done', 'failed')
+
+class InMemoryJobStore:
+    """Job state kept in the current process, evicted a while after it finishes"""
+
+    def __init__(self, ttl_seconds: float = 3600):
+        self.ttl_seconds = ttl_seconds
+        self._jobs = {}
+        self._condition = threading.Condition()
+
+    def create(self, job_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a queued job"""
+        job = {
+            'job_id': job_id,
+            'status': 'queued',
+            'created_at': datetime.utcnow().isoformat(),
+            **metadata
+        }
+        with self._condition:
+            self._evict_expired()
+            self._jobs[job_id] = (job, None)
+        return dict(job)
+
+    def update(self, job_id: str, **fields) -> None:
+        """Update a job and wake up anyone waiting on it"""
+        with self._condition:
+            job, finished_at = self._jobs[job_id]
+            job.update(fields, updated_at=datetime.utcnow().isoformat())
+            if job['status'] in FINISHED_STATUSES:
+                finished_at = time.monotonic()
+            self._jobs[job_id] = (job, finished_at)
+            self._condition.notify_all()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job, or None if it is unknown or expired"""
+        with self._condition:
+            entry = self._jobs.get(job_id)
+            return dict(entry[0]) if entry else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: wait up to timeout seconds for a job to finish"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                entry = self._jobs.get(job_id)
+                if entry is None:
+                    return None
+                remaining = deadline - time.monotonic()
+                if entry[0]['status'] in FINISHED_STATUSES or remaining <= 0:
+                    return dict(entry[0])
+                self._condition.wait(remaining)
+
+    def _evict_expired(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [
+            job_id for job_id, (_, finished_at) in self._jobs.items()
+            if finished_at is not None and finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+class MongoJobStore:
+    """Job state shared across processes through a TTL-indexed collection"""
+
+    def __init__(self, ttl_seconds: float = 3600, poll_interval: float = 0.25):
+        mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+        db_name = os.getenv('DB_NAME', 'bunker_baba')
+
+        self.client = MongoClient(mongodb_uri)
+        self.db = self.client[db_name]
+        self.collection = self.db.analysis_jobs
+        self.ttl_seconds = ttl_seconds
+        self.poll_interval = poll_interval
+
+        self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    def create(self, job_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a queued job"""
+        now = datetime.utcnow()
+        document = {
+            '_id': job_id,
+            'job_id': job_id,
+            'status': 'queued',
+            'created_at': now.isoformat(),
+            'expires_at': now + timedelta(seconds=self.ttl_seconds),
+            **metadata
+        }
+        self.collection.insert_one(document)
+        return self._to_job(document)
+
+    def update(self, job_id: str, **fields) -> None:
+        """Update a job"""
+        now = datetime.utcnow()
+        self.collection.update_one(
+            {'_id': job_id},
+            {
+                '$set': {
+                    **fields,
+                    'updated_at': now.isoformat(),
+                    'expires_at': now + timedelta(seconds=self.ttl_seconds)
+                }
+            }
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job, or None if it is unknown or expired"""
+        document = self.collection.find_one({'_id': job_id})
+        return self._to_job(document) if document else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: poll until a job finishes or timeout seconds pass"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in FINISHED_STATUSES or time.monotonic() >= deadline:
+                return job
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.monotonic())))
+
+    def _to_job(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in document.items() if key not in ('_id', 'expires_at')}
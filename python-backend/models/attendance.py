@@ -1,4 +1,4 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 from pymongo import MongoClient
 from bson import ObjectId
 import os
@@ -24,15 +24,29 @@ class AttendanceRecord:
 
     def save_record(self, student_id: str, department: str, data: Dict[str, Any]) -> str:
         """Save attendance record to database"""
-        document = {
+        document = self._build_document(student_id, department, data)
+        result = self.collection.insert_one(document)
+        return str(result.inserted_id)
+
+    def save_records(self, entries: List[Tuple[str, str, Dict[str, Any]]]) -> List[str]:
+        """Save several attendance records with a single bulk insert"""
+        if not entries:
+            return []
+        documents = [
+            self._build_document(student_id, department, data)
+            for student_id, department, data in entries
+        ]
+        result = self.collection.insert_many(documents)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+    def _build_document(self, student_id: str, department: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
             'student_id': student_id,
             'department': department,
             'attendance_data': data['attendance'],
             'recommendations': data['recommendations'],
             'created_at': datetime.datetime.utcnow()
         }
-        result = self.collection.insert_one(document)
-        return str(result.inserted_id)
 
     def get_student_records(self, student_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get attendance records for a student"""
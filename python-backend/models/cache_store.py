@@ -0,0 +1,43 @@
+from typing import Any, Optional
+from pymongo import MongoClient
+import os
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+class MongoCacheStore:
+    def __init__(self, collection_name: str, ttl_seconds: float):
+        mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+        db_name = os.getenv('DB_NAME', 'bunker_baba')
+
+        self.client = MongoClient(mongodb_uri)
+        self.db = self.client[db_name]
+        self.collection = self.db[collection_name]
+        self.ttl_seconds = ttl_seconds
+
+        # Let MongoDB expire entries on its own
+        self.collection.create_index('expires_at', expireAfterSeconds=0)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached value if it has not expired"""
+        entry = self.collection.find_one({
+            '_id': key,
+            'expires_at': {'$gt': datetime.utcnow()}
+        })
+        return entry['value'] if entry else None
+
+    def set(self, key: str, value: Any) -> None:
+        """Insert or refresh a cached value"""
+        now = datetime.utcnow()
+        self.collection.update_one(
+            {'_id': key},
+            {
+                '$set': {
+                    'value': value,
+                    'created_at': now,
+                    'expires_at': now + timedelta(seconds=self.ttl_seconds)
+                }
+            },
+            upsert=True
+        )
@@ -1,9 +1,13 @@
-from flask import Blueprint, request, jsonify
-import logging
-import google.generativeai as genai
+from flask import Blueprint, Response, request, jsonify
 import os
+import logging
 import json
 from dotenv import load_dotenv
+from utils import model_registry
+from utils.llm_cache import get_llm_cache
+from utils.gemini_client import GeminiUnavailable, estimate_tokens
+from utils.chat_sessions import get_chat_session_store
+from utils.chat_intents import answer_locally
 from models.attendance import AttendanceRecord
 
 # Load environment variables
@@ -17,10 +21,79 @@ logger = logging.getLogger(__name__)
 # Create blueprint
 chat_bp = Blueprint('chat', __name__)
 
-# Initialize Gemini
-api_key = os.environ.get('GEMINI_API_KEY')
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-2.0-flash')
+# Fixed persona and formula instructions, sent once as the model's system
+# instruction instead of with every message. Editing this text builds a new model.
+CHAT_SYSTEM_INSTRUCTION = """\
+You are Bunker Baba's attendance assistant. You help students understand their attendance data and answer questions about attendance requirements. You have a fun, witty, and slightly savage personality. You're not afraid to tease students about their attendance in a playful way, but you're still helpful and precise with calculations.
+
+Each message starts with the student's attendance as "subject|type|attended/total|%" lines, followed by a "Total|attended/total|%" line and an "Overall|%" line when available.
+
+Answer the user's question about attendance based ONLY on the attendance data sent with their message. Do not use any fallback data or make assumptions. If the question is about:
+
+1. How many classes they can miss while maintaining their required attendance percentage:
+   Calculate based on the current attendance data.
+   Formula: If current attendance is A% with X attended out of Y total classes, and target is T%, then to maintain T% after missing Z classes:
+   (X / (Y + Z - Z)) ≥ T/100, which simplifies to Z ≤ (X - T*Y/100) / (T/100)
+
+2. What their attendance percentage will be if they miss X more classes:
+   Calculate the new percentage based ONLY on the current attendance and total classes data provided.
+   Formula: New percentage = (Current attended classes / (Current total classes + X)) * 100
+
+3. How many classes they need to attend consecutively to reach Y% attendance:
+   Calculate the number of consecutive classes needed using ONLY the actual attendance data provided.
+   Formula: If current attendance is X out of Y classes, to reach target T%, need to attend Z more classes where:
+   (X + Z) / (Y + Z) ≥ T/100, which gives Z ≥ (T*Y/100 - X) / (1 - T/100)
+
+4. Their current attendance percentage:
+   Provide the overall percentage and subject-wise breakdown ONLY if this data is available.
+   Include which subjects are below the typical 75% attendance requirement.
+
+5. How many total classes have been conducted so far:
+   Sum up the total classes across all subjects ONLY from the data provided.
+   Break this down by subject if requested.
+
+6. Subject-specific attendance:
+   If asked about a specific subject, provide detailed information about just that subject.
+   Include current percentage, classes attended, and whether they're meeting requirements.
+
+If you don't have enough information to answer accurately, clearly explain what specific information is missing and suggest that the user should calculate their attendance first.
+
+PERSONALITY INSTRUCTIONS:
+- Be witty, fun, and slightly savage in your responses
+- Use playful teasing when appropriate (especially for low attendance)
+- Add humor and personality to your answers
+- Use casual language, slang, and occasional emojis
+- If attendance is good (>85%), be impressed and encouraging
+- If attendance is poor (<75%), be playfully judgmental but still helpful
+- Don't be afraid to be dramatic about attendance situations
+- Use creative metaphors and comparisons
+- Occasionally use pop culture references
+- Maintain a balance between being savage and being helpful
+
+RESPONSE STYLE EXAMPLES:
+- For good attendance: "Look at you showing up to class like it's your job! 90% attendance? Your professors probably know your name and everything!"
+- For poor attendance: "Yikes! 60% attendance? The university security might forget what you look like at this rate! Let's get that number up before they give your seat to someone else!"
+- For borderline attendance: "Living dangerously at 76% attendance, I see! Just barely keeping your head above water. One more missed class and you'll be writing those 'please sir, I need to pass' emails!"
+- For missing classes: "You can miss 3 more classes... but should you? That's like asking how many more cookies you can eat before the doctor calls it a problem!"
+
+Be precise with calculations but deliver them with personality. Do not make up any data that is not provided. Round percentages to two decimal places for clarity.
+
+If the user asks about improving their attendance, provide practical advice based on their current situation, but with a fun twist.
+
+IMPORTANT: Focus only on attendance data and helping students maintain good attendance. Never mention "bunk planner" or "bunking classes" in your responses.
+"""
+
+# Shared across requests instead of a new Mongo client per message
+attendance_record = AttendanceRecord()
+chat_sessions = get_chat_session_store()
+
+# Answer formulaic questions (classes left to miss, percentages, ...) without Gemini
+fast_path_enabled = os.environ.get('CHAT_FAST_PATH', 'true').lower() == 'true'
+
+# Sent while Gemini is timing out or the circuit breaker is open
+FALLBACK_RESPONSE = ("My crystal ball is taking a quick nap right now. "
+                     "Give me a minute and ask again!")
+
 
 @chat_bp.route('/chat', methods=['POST','OPTIONS'])
 def chat():
@@ -38,66 +111,235 @@ def chat():
         # Extract required parameters
         message = request_data.get('message', '')
         student_id = request_data.get('student_id', '')
-        context = request_data.get('context', {})
+        # Chat answers are meant to vary, so caching is opt-in per request
+        use_cache = bool(request_data.get('cache', False))
 
         if not message:
             return jsonify({"error": "Message is required"}), 400
 
-        # Get attendance data if student_id is provided
-        attendance_data = None
-        if student_id:
-            try:
-                attendance_record = AttendanceRecord()
-                records = attendance_record.get_student_records(student_id, limit=1)
-                if records and len(records) > 0:
-                    attendance_data = records[0]
-
-                    # Validate that we have the necessary data
-                    if 'attendance_data' not in attendance_data or 'records' not in attendance_data['attendance_data']:
-                        logger.warning("Incomplete attendance data found for student_id: %s", student_id)
-                        attendance_data = None
-            except Exception as e:
-                logger.error(f"Error retrieving attendance data: {str(e)}")
-                attendance_data = None
+        # Students get a session holding their attendance context and history
+        session = chat_sessions.get(student_id) if student_id else None
+        attendance_data, attendance_text = _attendance_context(student_id, session)
+
+        stream_format = _stream_format(request_data)
+
+        # Exact local answers for formulaic questions, Gemini for everything else
+        local_answer = answer_locally(message, attendance_data) if fast_path_enabled else None
+        if local_answer is not None:
+            logger.info(f"Answering chat locally with intent '{local_answer['intent']}'")
+            if session is not None:
+                session.add_turn(message, local_answer['response'])
+            return _local_response(local_answer, stream_format)
+
+        history_text = session.render_history() if session else ""
 
         # Prepare prompt for Gemini
-        prompt = _prepare_prompt(message, attendance_data, context)
+        prompt = _prepare_prompt(message, attendance_text, history_text)
 
         # Call Gemini API
+        model = model_registry.get_gemini_model(system_instruction=CHAT_SYSTEM_INSTRUCTION)
+        if model is None:
+            return jsonify({"error": "Chat assistant is not configured"}), 503
+
+        usage = _prompt_usage(prompt)
+
+        if stream_format:
+            logger.info(f"Streaming Gemini chat response as {stream_format}")
+            return _stream_response(model, prompt, use_cache, stream_format, usage, message, session)
+
         logger.info("Calling Gemini API for chat response")
-        response = model.generate_content(prompt)
+        try:
+            response_text, reported_usage = get_llm_cache().generate_with_usage(model, prompt, use_cache=use_cache)
+        except GeminiUnavailable as e:
+            logger.warning(f"Gemini unavailable, sending fallback chat response: {str(e)}")
+            return jsonify({
+                "success": True,
+                "response": FALLBACK_RESPONSE,
+                "fallback": True
+            })
+
+        if session is not None:
+            session.add_turn(message, response_text)
+
+        if reported_usage:
+            usage.update(reported_usage)
+            logger.info(f"Gemini reported {reported_usage['promptTokens']} prompt tokens for chat")
 
         return jsonify({
             "success": True,
-            "response": response.text
+            "response": response_text,
+            "source": "gemini",
+            "usage": usage
         })
 
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-def _add_overall_attendance(attendance_data, prompt):
-    """Add overall attendance information to the prompt"""
-    if 'attendance_data' in attendance_data and 'overallPercentage' in attendance_data['attendance_data']:
-        overall_percentage = attendance_data['attendance_data']['overallPercentage']
-        if overall_percentage is not None:
-            return f"\nOverall attendance percentage: {overall_percentage}%"
-    return ""
+def _load_attendance_data(student_id):
+    """Latest attendance record of a student, or None if there is no usable one"""
+    try:
+        records = attendance_record.get_student_records(student_id, limit=1)
+        if records and len(records) > 0:
+            attendance_data = records[0]
+
+            # Validate that we have the necessary data
+            if 'attendance_data' not in attendance_data or 'records' not in attendance_data['attendance_data']:
+                logger.warning("Incomplete attendance data found for student_id: %s", student_id)
+                return None
+            return attendance_data
+    except Exception as e:
+        logger.error(f"Error retrieving attendance data: {str(e)}")
+    return None
+
+def _attendance_context(student_id, session):
+    """
+    Latest attendance record and its rendering for the prompt, cached in the
+    student's session
 
-def _add_subject_attendance(attendance_data, prompt):
-    """Add subject-wise attendance information to the prompt"""
-    if 'attendance_data' not in attendance_data or 'records' not in attendance_data['attendance_data']:
-        return "", 0, 0
+    The session keeps them until /analyze saves a new record for the student
+    or the session expires.
 
-    records = attendance_data['attendance_data']['records']
+    Returns:
+        tuple: The attendance document (or None) and the rendered context
+    """
+    if not student_id:
+        return None, ""
+
+    generation = None
+    if session is not None:
+        generation, cached_data, cached_context = session.get_context()
+        if cached_context is not None:
+            chat_sessions.record_context_lookup(hit=True)
+            return cached_data, cached_context
+    chat_sessions.record_context_lookup(hit=False)
+
+    attendance_text = ""
+    attendance_data = _load_attendance_data(student_id)
+    if attendance_data:
+        try:
+            attendance_text = _serialize_attendance(attendance_data)
+        except Exception as e:
+            logger.error(f"Error processing attendance data for prompt: {str(e)}")
+            # If there's an error processing the data, don't include it in the prompt
+            return attendance_data, "Attendance data: unavailable due to an error."
+
+    # A new record saved while this one loaded wins; don't cache the old one
+    if session is not None and not session.store_context(generation, attendance_data, attendance_text):
+        logger.info(f"Attendance context for {student_id} changed while loading, not caching it")
+    return attendance_data, attendance_text
+
+def _local_response(local_answer, stream_format):
+    """Send a locally computed answer in the format the client asked for"""
+    payload = {
+        'success': True,
+        'response': local_answer['response'],
+        'source': 'local',
+        'intent': local_answer['intent']
+    }
+    if not stream_format:
+        return jsonify(payload)
+
+    def generate():
+        yield _format_chunk(stream_format, 'chunk', {'text': local_answer['response']})
+        yield _format_chunk(stream_format, 'done', payload)
+
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype, headers={'Cache-Control': 'no-cache'})
+
+def _prompt_usage(prompt):
+    """
+    Estimate the prompt size of a chat request
+
+    The system instruction is sent once with the model, so only the per-request
+    prompt counts per message; inlineEstimatedTokens is what the same request
+    would cost with the instructions inlined.
+    """
+    request_tokens = estimate_tokens(prompt)
+    system_tokens = estimate_tokens(CHAT_SYSTEM_INSTRUCTION)
+    logger.info(f"Chat prompt ~{request_tokens} tokens per request, "
+                f"~{request_tokens + system_tokens} with the instructions inlined")
+    return {
+        'estimatedPromptTokens': request_tokens,
+        'systemInstructionTokens': system_tokens,
+        'inlineEstimatedTokens': request_tokens + system_tokens
+    }
+
+def _stream_format(request_data):
+    """
+    Pick the streaming format for a chat request
+
+    Returns:
+        str: 'sse' or 'ndjson', or None for a plain JSON response
+    """
+    accept = request.headers.get('Accept', '')
+    stream = request_data.get('stream')
+    if stream == 'ndjson' or 'application/x-ndjson' in accept:
+        return 'ndjson'
+    if stream or 'text/event-stream' in accept:
+        return 'sse'
+    return None
+
+def _format_chunk(stream_format, event, payload):
+    """Format one streamed message as a Server-Sent Event or a JSON line"""
+    if stream_format == 'sse':
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps({'type': event, **payload}) + "\n"
+
+def _stream_response(model, prompt, use_cache, stream_format, usage, message, session):
+    """
+    Stream the chat response as it is generated
+
+    Sends a 'chunk' message per piece of text, then 'done' with the full
+    response (or the fallback response if Gemini became unavailable).
+    """
+    def generate():
+        chunks = []
+        try:
+            for text in get_llm_cache().stream(model, prompt, use_cache=use_cache):
+                chunks.append(text)
+                yield _format_chunk(stream_format, 'chunk', {'text': text})
+        except GeminiUnavailable as e:
+            logger.warning(f"Gemini unavailable during chat stream: {str(e)}")
+            if not chunks:
+                yield _format_chunk(stream_format, 'chunk', {'text': FALLBACK_RESPONSE})
+                yield _format_chunk(stream_format, 'done', {'success': True, 'response': FALLBACK_RESPONSE,
+                                                            'fallback': True})
+            else:
+                yield _format_chunk(stream_format, 'error', {'success': False, 'error': str(e)})
+            return
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {str(e)}")
+            yield _format_chunk(stream_format, 'error', {'success': False, 'error': str(e)})
+            return
+
+        response_text = ''.join(chunks)
+        if session is not None:
+            session.add_turn(message, response_text)
+        yield _format_chunk(stream_format, 'done', {'success': True, 'response': response_text,
+                                                    'usage': usage})
+
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return Response(generate(), mimetype=mimetype, headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _serialize_attendance(attendance_data):
+    """
+    Compact, deterministic rendering of a student's attendance for the prompt
+
+    One line per subject, sorted by subject and class type, followed by the
+    overall totals. Returns an empty string if there are no usable records.
+    """
+    attendance = attendance_data.get('attendance_data') or {}
+    records = attendance.get('records')
     if not records or not isinstance(records, list):
-        return "", 0, 0
+        return ""
 
-    result = "\n\nSubject-wise attendance:"
+    rows = []
     total_attended = 0
     total_classes = 0
-    has_valid_records = False
-
     for record in records:
         if not isinstance(record, dict):
             continue
@@ -114,18 +356,24 @@ def _add_subject_attendance(attendance_data, prompt):
 
         # Only include if we have actual data
         if subject_name and attended > 0 and total > 0:
-            result += f"\n- {subject_name} ({class_type}): {attended}/{total} classes ({percentage}%)"
+            rows.append((subject_name, class_type, attended, total, percentage))
             total_attended += attended
             total_classes += total
-            has_valid_records = True
 
-    # Add totals only if we have valid records
-    if has_valid_records and total_classes > 0:
-        overall = (total_attended / total_classes) * 100
-        result += f"\n\nTotal classes attended: {total_attended}/{total_classes} ({overall:.2f}%)"
-        return result, total_attended, total_classes
+    if not rows:
+        return ""
+
+    lines = ["Attendance (subject|type|attended/total|%):"]
+    lines.extend(
+        f"{subject}|{class_type}|{attended}/{total}|{percentage:.2f}"
+        for subject, class_type, attended, total, percentage in sorted(rows)
+    )
+    lines.append(f"Total|{total_attended}/{total_classes}|{total_attended / total_classes * 100:.2f}")
 
-    return "", 0, 0
+    overall_percentage = attendance.get('overallPercentage')
+    if overall_percentage is not None:
+        lines.append(f"Overall|{overall_percentage}")
+    return "\n".join(lines)
 
 def _add_bunk_planner_data(attendance_data, prompt):
     """Add bunk planner calculations to the prompt"""
@@ -154,92 +402,16 @@ def _add_bunk_planner_data(attendance_data, prompt):
 
     return ""
 
-def _prepare_prompt(message, attendance_data, context):
+def _prepare_prompt(message, attendance_text, history_text=""):
     """
-    Prepare prompt for Gemini based on user message and attendance data
-    """
-    prompt = f"""
-    You are Bunker Baba's attendance assistant. You help students understand their attendance data and answer questions about attendance requirements. You have a fun, witty, and slightly savage personality. You're not afraid to tease students about their attendance in a playful way, but you're still helpful and precise with calculations.
+    Prepare the per-request part of the Gemini prompt
 
-    User message: {message}
+    The fixed persona and formula instructions live in CHAT_SYSTEM_INSTRUCTION,
+    so this only carries the student's data, the conversation so far and
+    their message.
     """
-
-    if attendance_data:
-        try:
-            prompt += "\n\nAttendance data:"
-
-            # Add overall attendance information
-            prompt += _add_overall_attendance(attendance_data, prompt)
-
-            # Add subject-wise attendance information
-            subject_data, total_attended, total_classes = _add_subject_attendance(attendance_data, prompt)
-            prompt += subject_data
-
-            # Add additional context about the data
-            if total_attended > 0 and total_classes > 0:
-                prompt += f"\n\nThis data represents the student's current attendance status with {total_attended} classes attended out of {total_classes} total classes conducted."
-
-        except Exception as e:
-            logger.error(f"Error processing attendance data for prompt: {str(e)}")
-            # If there's an error processing the data, don't include it in the prompt
-            prompt += "\n\nUnable to process attendance data due to an error."
-
-    # Add instructions for the assistant
-    prompt += """
-
-    Answer the user's question about attendance based ONLY on the data provided above. Do not use any fallback data or make assumptions. If the question is about:
-
-    1. How many classes they can miss while maintaining their required attendance percentage:
-       Calculate based on the current attendance data.
-       Formula: If current attendance is A% with X attended out of Y total classes, and target is T%, then to maintain T% after missing Z classes:
-       (X / (Y + Z - Z)) ≥ T/100, which simplifies to Z ≤ (X - T*Y/100) / (T/100)
-
-    2. What their attendance percentage will be if they miss X more classes:
-       Calculate the new percentage based ONLY on the current attendance and total classes data provided.
-       Formula: New percentage = (Current attended classes / (Current total classes + X)) * 100
-
-    3. How many classes they need to attend consecutively to reach Y% attendance:
-       Calculate the number of consecutive classes needed using ONLY the actual attendance data provided.
-       Formula: If current attendance is X out of Y classes, to reach target T%, need to attend Z more classes where:
-       (X + Z) / (Y + Z) ≥ T/100, which gives Z ≥ (T*Y/100 - X) / (1 - T/100)
-
-    4. Their current attendance percentage:
-       Provide the overall percentage and subject-wise breakdown ONLY if this data is available.
-       Include which subjects are below the typical 75% attendance requirement.
-
-    5. How many total classes have been conducted so far:
-       Sum up the total classes across all subjects ONLY from the data provided.
-       Break this down by subject if requested.
-
-    6. Subject-specific attendance:
-       If asked about a specific subject, provide detailed information about just that subject.
-       Include current percentage, classes attended, and whether they're meeting requirements.
-
-    If you don't have enough information to answer accurately, clearly explain what specific information is missing and suggest that the user should calculate their attendance first.
-
-    PERSONALITY INSTRUCTIONS:
-    - Be witty, fun, and slightly savage in your responses
-    - Use playful teasing when appropriate (especially for low attendance)
-    - Add humor and personality to your answers
-    - Use casual language, slang, and occasional emojis
-    - If attendance is good (>85%), be impressed and encouraging
-    - If attendance is poor (<75%), be playfully judgmental but still helpful
-    - Don't be afraid to be dramatic about attendance situations
-    - Use creative metaphors and comparisons
-    - Occasionally use pop culture references
-    - Maintain a balance between being savage and being helpful
-
-    RESPONSE STYLE EXAMPLES:
-    - For good attendance: "Look at you showing up to class like it's your job! 90% attendance? Your professors probably know your name and everything!"
-    - For poor attendance: "Yikes! 60% attendance? The university security might forget what you look like at this rate! Let's get that number up before they give your seat to someone else!"
-    - For borderline attendance: "Living dangerously at 76% attendance, I see! Just barely keeping your head above water. One more missed class and you'll be writing those 'please sir, I need to pass' emails!"
-    - For missing classes: "You can miss 3 more classes... but should you? That's like asking how many more cookies you can eat before the doctor calls it a problem!"
-
-    Be precise with calculations but deliver them with personality. Do not make up any data that is not provided. Round percentages to two decimal places for clarity.
-
-    If the user asks about improving their attendance, provide practical advice based on their current situation, but with a fun twist.
-
-    IMPORTANT: Focus only on attendance data and helping students maintain good attendance. Never mention "bunk planner" or "bunking classes" in your responses.
-    """
-
-    return prompt
+    parts = [attendance_text or "Attendance data: none provided."]
+    if history_text:
+        parts.append(history_text)
+    parts.append(f"User message: {message}")
+    return "\n".join(parts)
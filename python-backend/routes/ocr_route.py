@@ -1,12 +1,29 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 import logging
 from utils.ocr_processor import OCRProcessor
+from utils.ocr_worker_pool import OCRWorkerPool
 from utils.gemini_processor import GeminiProcessor
 from utils.attendance_calculator import AttendanceCalculator
 from models.weekly_schedule import WeeklySchedule
 from models.attendance import AttendanceRecord
-from PIL import Image
-import tempfile
+from models.cache_store import MongoCacheStore
+from models.analysis_job import InMemoryJobStore, MongoJobStore
+from utils.cache import LRUCache, TieredCache, content_key
+from utils.attendance_parser import parse_attendance_text, score_local_parse
+from utils.llm_cache import get_llm_cache
+from utils.chat_sessions import get_chat_session_store
+from utils import model_registry
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.image_loader import ImageTooLargeError, decode_grayscale, read_upload
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import zipfile
+import queue
+import io
+import json
+import math
+import time
+import uuid
 import os
 
 # Configure logging
@@ -18,12 +35,304 @@ logger = logging.getLogger(__name__)
 ocr_bp = Blueprint('ocr', __name__)
 
 # Initialize processors and models
-ocr_processor = OCRProcessor()
-gemini_processor = GeminiProcessor()
+ocr_processor = OCRProcessor(
+    batch_window_ms=float(os.environ.get('OCR_BATCH_WINDOW_MS', 0)),
+    max_batch_size=int(os.environ.get('OCR_BATCH_MAX_SIZE', 8))
+)
+ocr_workers = int(os.environ.get('OCR_WORKERS', 0))
+if ocr_workers > 0 and ocr_processor.batch_window_ms > 0:
+    # Each forked worker would get its own batcher, where concurrent calls never meet
+    raise ValueError("OCR_BATCH_WINDOW_MS cannot be combined with OCR_WORKERS")
+if ocr_workers > 0:
+    # Run OCR in a pre-forked worker pool that shares the loaded model
+    ocr_runner = OCRWorkerPool(
+        ocr_processor,
+        workers=ocr_workers,
+        torch_threads=int(os.environ.get('OCR_TORCH_THREADS', 1)),
+        timeout=float(os.environ.get('OCR_WORKER_TIMEOUT', 120)),
+        warm_up=os.environ.get('WARMUP_ON_START', 'true').lower() == 'true'
+    )
+    # /ready waits for the forked workers too, not only the master
+    model_registry.add_readiness_check('ocrWorkers', ocr_runner.is_warm)
+else:
+    ocr_runner = ocr_processor
+gemini_processor = GeminiProcessor(
+    batch_window_ms=float(os.environ.get('GEMINI_BATCH_WINDOW_MS', 0)),
+    max_batch_size=int(os.environ.get('GEMINI_BATCH_MAX_SIZE', 8)),
+    # As many batches in flight as the Gemini client has threads
+    batch_workers=int(os.environ.get('GEMINI_CLIENT_THREADS', 16))
+)
 attendance_calculator = AttendanceCalculator()
 weekly_schedule = WeeklySchedule()
 attendance_record = AttendanceRecord()
 
+# Admission control around the OCR stage
+ocr_admission = AdmissionController(
+    max_concurrent=int(os.environ.get('OCR_MAX_CONCURRENT', max(ocr_workers, 2))),
+    max_queue=int(os.environ.get('OCR_MAX_QUEUE', 16)),
+    deadline_seconds=float(os.environ.get('OCR_QUEUE_DEADLINE', 10)),
+    name='OCR'
+)
+
+# Upload limits, checked before any image data is decoded
+max_upload_bytes = int(os.environ.get('MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+max_image_pixels = int(os.environ.get('MAX_IMAGE_PIXELS', 25_000_000))
+
+# Background analysis jobs
+job_ttl = float(os.environ.get('ANALYZE_JOB_TTL', 60 * 60))
+job_store = (MongoJobStore(job_ttl)
+             if os.environ.get('ANALYZE_JOB_STORE', 'memory').lower() == 'mongo'
+             else InMemoryJobStore(job_ttl))
+job_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ANALYZE_JOB_WORKERS', 4)),
+                                  thread_name_prefix='analysis-job')
+job_max_pending = int(os.environ.get('ANALYZE_JOB_MAX_PENDING', 100))
+job_max_wait = float(os.environ.get('ANALYZE_JOB_MAX_WAIT', 30))
+job_pending = 0
+job_pending_lock = threading.Lock()
+
+# Bulk uploads: pages are extracted in parallel on this pool
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+bulk_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('BULK_WORKERS', max(ocr_workers, 2))),
+                                   thread_name_prefix='bulk-analysis')
+bulk_max_pages = int(os.environ.get('BULK_MAX_PAGES', 50))
+bulk_max_archive_bytes = int(os.environ.get('BULK_MAX_ARCHIVE_BYTES', 50 * 1024 * 1024))
+
+# Cache of extracted attendance data keyed by a hash of the uploaded image
+result_cache_ttl = float(os.environ.get('RESULT_CACHE_TTL', 24 * 60 * 60))
+result_cache = TieredCache(
+    LRUCache(max_entries=int(os.environ.get('RESULT_CACHE_SIZE', 256)),
+             ttl_seconds=result_cache_ttl),
+    persistent=(MongoCacheStore('analysis_cache', result_cache_ttl)
+                if os.environ.get('RESULT_CACHE_MONGO', 'false').lower() == 'true' else None),
+    name='result-cache'
+)
+
+# Local-first extraction: Gemini is only called when the local parse scores
+# below this threshold (set above 1 to always call Gemini)
+local_parse_threshold = float(os.environ.get('LOCAL_PARSE_THRESHOLD', 0.9))
+extraction_counts = {'local': 0, 'gemini': 0, 'cache': 0}
+extraction_counts_lock = threading.Lock()
+
+def _parse_analysis_request():
+    """
+    Validate an analysis upload and read it into memory
+
+    Returns:
+        tuple: (params, None) on success or (None, error_response) on failure
+    """
+    # Check if image is in request
+    if 'screenshot' not in request.files:
+        return None, (jsonify({"error": "No screenshot provided"}), 400)
+
+    # Get parameters
+    image_file = request.files['screenshot']
+    params = {
+        'student_id': request.form.get('student_id', '123'),
+        'department': request.form.get('department'),
+        'desired_attendance': float(request.form.get('desiredAttendance', 75)),
+        'weeks_remaining': int(request.form.get('timeFrame', 4))
+    }
+
+    if not params['department']:
+        return None, (jsonify({"error": "Department is required"}), 400)
+
+    if request.content_length and request.content_length > max_upload_bytes:
+        return None, (jsonify({"error": f"Upload exceeds the maximum size of {max_upload_bytes} bytes"}), 413)
+
+    try:
+        params['image_bytes'] = read_upload(image_file.stream, max_upload_bytes)
+    except ImageTooLargeError as e:
+        return None, (jsonify({"success": False, "error": str(e)}), 413)
+
+    return params, None
+
+def _event_emitter(on_event):
+    """
+    Wrap an event callback so every event carries pipeline timings
+
+    Returns:
+        function: emit(stage, payload=None) adding elapsedMs since the pipeline
+                  started and stageMs since the previous event
+    """
+    start = time.monotonic()
+    last = [start]
+
+    def emit(stage, payload=None):
+        if on_event is None:
+            return
+        now = time.monotonic()
+        event = dict(payload or {})
+        event['elapsedMs'] = round((now - start) * 1000, 1)
+        event['stageMs'] = round((now - last[0]) * 1000, 1)
+        last[0] = now
+        on_event(stage, event)
+
+    return emit
+
+def _department_courses(department):
+    """Course keys of a department's weekly schedule, or None if it has none"""
+    try:
+        return list(weekly_schedule.get_department_schedule(department).keys())
+    except ValueError:
+        return None
+
+def _count_extraction(source):
+    with extraction_counts_lock:
+        extraction_counts[source] += 1
+
+def _extract_attendance(image_bytes, student_id, department, emit, on_record=None):
+    """
+    Turn a screenshot into structured attendance data (cache, OCR, extraction)
+
+    The local parser's result is used as is when it found every subject row
+    and scores at least local_parse_threshold; otherwise the OCR text goes to
+    Gemini.
+
+    Args:
+        emit: Event emitter from _event_emitter
+        on_record: Optional callback given each record as Gemini streams it
+
+    Returns:
+        tuple: Structured attendance data with student_id set, and the
+               extraction info (source: local, gemini or cache; confidence;
+               partial when the Gemini stream broke off)
+    """
+    # Whether the local parse is trusted depends on the department's courses
+    cache_key = content_key(image_bytes + b'\0' + str(department or '').encode('utf-8'))
+
+    # Reuse the extraction from an earlier upload of the same screenshot
+    structured_data = result_cache.get(cache_key)
+    if structured_data is not None:
+        logger.info("Using cached attendance data for uploaded screenshot")
+        extraction = {'source': 'cache', 'confidence': None}
+        emit('cached', {'attendance': structured_data})
+    else:
+        # Bound how many requests decode and OCR at the same time
+        with ocr_admission.admit() as queue_wait:
+            # Decode straight into a grayscale buffer, no temp file needed
+            image_np = decode_grayscale(image_bytes, max_image_pixels)
+            emit('decoded', {'width': image_np.shape[1], 'height': image_np.shape[0],
+                             'queueWaitMs': round(queue_wait * 1000, 1)})
+
+            # Extract text with OCR
+            logger.info(f"Processing image with OCR after {queue_wait * 1000:.0f}ms in queue")
+            ocr_result = ocr_runner.process_image_detailed(image_np, on_event=emit)
+        extracted_text = ocr_result['text']
+        logger.info(f"OCR mode '{ocr_result['mode']}' ran variants {ocr_result['variantsRun']}, "
+                    f"succeeded with: {ocr_result['variant']}")
+
+        # Local parse gives the client partial results before Gemini answers
+        local_data = parse_attendance_text(extracted_text, student_id=student_id, codes_only=True)
+        confidence = score_local_parse(extracted_text, local_data, _department_courses(department))
+        emit('parsed', {**local_data, 'confidence': confidence})
+
+        if confidence['coverage'] == 1.0 and confidence['score'] >= local_parse_threshold:
+            logger.info(f"Local parse confidence {confidence['score']}, skipping Gemini")
+            structured_data = local_data
+            extraction = {'source': 'local', 'confidence': confidence}
+        else:
+            logger.info(f"Local parse confidence {confidence['score']}, extracting with Gemini")
+            structured_data = gemini_processor.process_text(extracted_text, on_record=on_record)
+            extraction = {'source': 'gemini', 'confidence': confidence}
+            if structured_data.pop('partial', False):
+                extraction['partial'] = True
+            emit('gemini', {'attendance': structured_data})
+
+        # Don't pin a failed or incomplete extraction to this screenshot
+        if structured_data.get('records') and not extraction.get('partial'):
+            result_cache.set(cache_key, structured_data)
+
+    _count_extraction(extraction['source'])
+
+    # Ensure student_id is set
+    structured_data['student_id'] = student_id
+    return structured_data, extraction
+
+def _partial_recommender(department, student_id, desired_attendance, weeks_remaining, emit):
+    """
+    Build an on_record callback that recalculates recommendations as records stream in
+
+    Each call emits a 'record' event with the new record and the recommendations
+    for every record received so far, so clients see a first recommendation
+    before Gemini has finished.
+    """
+    records = []
+    schedule = {}
+
+    def on_record(record):
+        if 'courses' not in schedule:
+            try:
+                schedule['courses'] = attendance_calculator.get_department_schedule(department)
+            except ValueError:
+                schedule['courses'] = None
+        records.append(record)
+
+        recommendations = None
+        if schedule['courses'] is not None:
+            recommendations = attendance_calculator.calculate_allowed_skips(
+                department,
+                {'student_id': student_id, 'records': list(records)},
+                desired_attendance,
+                weeks_remaining,
+                department_schedule=schedule['courses']
+            )
+        emit('record', {'record': record, 'recordsSoFar': len(records),
+                        'recommendations': recommendations})
+
+    return on_record
+
+def _run_analysis(image_bytes, student_id, department, desired_attendance, weeks_remaining,
+                  on_event=None):
+    """
+    Run the analysis pipeline: OCR, extraction, recommendations and saving
+
+    Args:
+        on_event: Optional callback(stage, payload) called as each stage finishes
+
+    Returns:
+        dict: The analysis data, how it was extracted and the id of the saved
+              record (None when the extraction was partial and not saved)
+    """
+    emit = _event_emitter(on_event)
+
+    # Only stream partial recommendations when someone is listening
+    on_record = None
+    if on_event is not None:
+        on_record = _partial_recommender(department, student_id, desired_attendance, weeks_remaining, emit)
+
+    structured_data, extraction = _extract_attendance(image_bytes, student_id, department, emit,
+                                                      on_record=on_record)
+
+    # Calculate recommendations
+    recommendations = attendance_calculator.calculate_allowed_skips(
+        department,
+        structured_data,
+        desired_attendance,
+        weeks_remaining
+    )
+    emit('recommendations', {'recommendations': recommendations})
+
+    # Save to database
+    result_data = {
+        'attendance': structured_data,
+        'recommendations': recommendations
+    }
+    if extraction.get('partial'):
+        # Don't store an extraction that may be missing subjects
+        logger.warning(f"Not saving partial extraction for student {student_id}")
+        record_id = None
+    else:
+        record_id = attendance_record.save_record(student_id, department, result_data)
+        # The student's chat session must pick up the new record
+        get_chat_session_store().invalidate_context(student_id)
+    emit('saved', {'record_id': record_id})
+
+    return {
+        'data': result_data,
+        'extraction': extraction,
+        'record_id': record_id
+    }
+
 @ocr_bp.route('/analyze', methods=['POST','OPTIONS'])
 def analyze_attendance():
     """
@@ -31,68 +340,37 @@ def analyze_attendance():
     """
     try:
         logger.info("Received attendance analysis request")
-        
-        # Check if image is in request
-        if 'screenshot' not in request.files:
-            return jsonify({"error": "No screenshot provided"}), 400
-        
-        # Get parameters
-        image_file = request.files['screenshot']
-        student_id = request.form.get('student_id', '123')
-        department = request.form.get('department')
-        desired_attendance = float(request.form.get('desiredAttendance', 75))
-        weeks_remaining = int(request.form.get('timeFrame', 4))
-        
-        if not department:
-            return jsonify({"error": "Department is required"}), 400
+
+        params, error_response = _parse_analysis_request()
+        if error_response:
+            return error_response
         
         # Process image with OCR
         try:
-            # Create a temporary file
-            fd, temp_path = tempfile.mkstemp(suffix='.png')
-            os.close(fd)
-            
-            # Save and process the image
-            image = Image.open(image_file)
-            image.convert('RGB').save(temp_path)
-            
-            # Extract text with OCR
-            logger.info("Processing image with OCR")
-            extracted_text = ocr_processor.process_image(temp_path)
-            
-            # Clean up
-            os.unlink(temp_path)
-            
-            # If the OCR processor returned a dictionary (parsed data), use it directly
-            if isinstance(extracted_text, dict):
-                structured_data = extracted_text
-            else:
-                # Otherwise, process the text with Gemini
-                structured_data = gemini_processor.process_text(extracted_text)
-            
-            # Ensure student_id is set
-            structured_data['student_id'] = student_id
-            
-            # Calculate recommendations
-            recommendations = attendance_calculator.calculate_allowed_skips(
-                department,
-                structured_data,
-                desired_attendance,
-                weeks_remaining
-            )
-            
-            # Save to database
-            result_data = {
-                'attendance': structured_data,
-                'recommendations': recommendations
-            }
-            record_id = attendance_record.save_record(student_id, department, result_data)
+            result = _run_analysis(**params)
             
             return jsonify({
                 "success": True,
-                "data": result_data,
-                "record_id": record_id
+                "data": result['data'],
+                "extraction": result['extraction'],
+                "record_id": result['record_id']
+            })
+
+        except AdmissionRejected as e:
+            logger.warning(f"Rejected analysis request: {str(e)}")
+            response = jsonify({
+                "success": False,
+                "error": str(e)
             })
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, e.status_code
+
+        except ImageTooLargeError as e:
+            logger.warning(f"Rejected upload: {str(e)}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 413
             
         except Exception as e:
             logger.error(f"Processing failed: {str(e)}")
@@ -105,6 +383,337 @@ def analyze_attendance():
         logger.error(f"Error processing request: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def _format_sse(event, payload):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+@ocr_bp.route('/analyze/stream', methods=['POST','OPTIONS'])
+def analyze_attendance_stream():
+    """
+    Same as /analyze, but streams Server-Sent Events as each pipeline stage
+    finishes (decoded, preprocessed, ocr_variant, parsed, record, gemini,
+    recommendations, saved) followed by a final 'done' or 'error' event.
+    """
+    try:
+        logger.info("Received streaming attendance analysis request")
+
+        params, error_response = _parse_analysis_request()
+        if error_response:
+            return error_response
+
+        events = queue.Queue()
+
+        def run():
+            try:
+                result = _run_analysis(**params, on_event=lambda stage, payload: events.put((stage, payload)))
+                events.put(('done', {'success': True, **result}))
+            except AdmissionRejected as e:
+                events.put(('error', {'success': False, 'error': str(e),
+                                      'status': e.status_code, 'retryAfter': e.retry_after}))
+            except ImageTooLargeError as e:
+                events.put(('error', {'success': False, 'error': str(e), 'status': 413}))
+            except Exception as e:
+                logger.error(f"Streaming analysis failed: {str(e)}")
+                events.put(('error', {'success': False, 'error': str(e), 'status': 500}))
+
+        threading.Thread(target=run, name='analysis-stream', daemon=True).start()
+
+        def generate():
+            while True:
+                stage, payload = events.get()
+                yield _format_sse(stage, payload)
+                if stage in ('done', 'error'):
+                    return
+
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _read_bulk_pages(default_student_id):
+    """
+    Collect the screenshots of a bulk upload
+
+    Pages come either from repeated 'screenshots' files, optionally paired with
+    repeated 'student_ids' values, or from a zip 'archive' where each top-level
+    folder is a student id (files at the root belong to the default student).
+
+    Returns:
+        list: (student_id, page_name, image_bytes) tuples
+    """
+    pages = []
+
+    if 'archive' in request.files:
+        archive_bytes = read_upload(request.files['archive'].stream, bulk_max_archive_bytes)
+        with zipfile.ZipFile(io.BytesIO(archive_bytes)) as archive:
+            entries = [
+                info for info in archive.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+                and not os.path.basename(info.filename).startswith('.')
+            ]
+            if len(entries) > bulk_max_pages:
+                raise ValueError(f"Archive has more than {bulk_max_pages} screenshots")
+
+            for info in sorted(entries, key=lambda entry: entry.filename):
+                # Check the declared size before inflating anything
+                if info.file_size > max_upload_bytes:
+                    raise ImageTooLargeError(f"{info.filename} exceeds the maximum size of {max_upload_bytes} bytes")
+                parts = info.filename.strip('/').split('/')
+                student_id = parts[0] if len(parts) > 1 else default_student_id
+                pages.append((student_id, info.filename, archive.read(info)))
+        return pages
+
+    files = request.files.getlist('screenshots')
+    if len(files) > bulk_max_pages:
+        raise ValueError(f"At most {bulk_max_pages} screenshots can be uploaded at once")
+
+    student_ids = request.form.getlist('student_ids')
+    if student_ids and len(student_ids) != len(files):
+        raise ValueError("'student_ids' must have one entry per screenshot")
+
+    for index, image_file in enumerate(files):
+        student_id = student_ids[index] if student_ids else default_student_id
+        pages.append((student_id, image_file.filename or f"page-{index + 1}",
+                      read_upload(image_file.stream, max_upload_bytes)))
+    return pages
+
+def _merge_student_pages(student_id, page_data):
+    """
+    Merge the attendance extracted from several pages of one student
+
+    A subject and class type seen on more than one page (overlapping pages) is
+    kept once, from the page with the most classes.
+    """
+    merged = {}
+    for structured_data in page_data:
+        for record in structured_data.get('records', []):
+            key = (record['subjectName'].split('/')[0].strip(), record['classType'])
+            if key not in merged or record['total'] > merged[key]['total']:
+                merged[key] = record
+
+    records = list(merged.values())
+    total_attended = sum(record['attended'] for record in records)
+    total_classes = sum(record['total'] for record in records)
+
+    return {
+        'student_id': student_id,
+        'records': records,
+        'overallPercentage': round((total_attended / total_classes) * 100, 2) if total_classes > 0 else 0
+    }
+
+@ocr_bp.route('/analyze/bulk', methods=['POST','OPTIONS'])
+def analyze_attendance_bulk():
+    """
+    Analyze many screenshots in one request. Pages are OCR'd in parallel,
+    merged per student, and all results are saved with one bulk insert.
+    """
+    try:
+        logger.info("Received bulk attendance analysis request")
+
+        department = request.form.get('department')
+        desired_attendance = float(request.form.get('desiredAttendance', 75))
+        weeks_remaining = int(request.form.get('timeFrame', 4))
+        default_student_id = request.form.get('student_id', '123')
+
+        if not department:
+            return jsonify({"error": "Department is required"}), 400
+
+        try:
+            pages = _read_bulk_pages(default_student_id)
+        except ImageTooLargeError as e:
+            return jsonify({"success": False, "error": str(e)}), 413
+        except (ValueError, zipfile.BadZipFile) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        if not pages:
+            return jsonify({"error": "No screenshots provided"}), 400
+
+        logger.info(f"Analyzing {len(pages)} pages for {len(set(page[0] for page in pages))} students")
+
+        # OCR and extract every page in parallel
+        futures = [
+            (student_id, page_name,
+             bulk_executor.submit(_extract_attendance, image_bytes, student_id, department,
+                                  _event_emitter(None)))
+            for student_id, page_name, image_bytes in pages
+        ]
+
+        pages_by_student = {}
+        extraction_by_student = {}
+        errors = []
+        for student_id, page_name, future in futures:
+            try:
+                page_data, extraction = future.result()
+                pages_by_student.setdefault(student_id, []).append(page_data)
+                extraction_by_student.setdefault(student_id, []).append({"page": page_name, **extraction})
+            except Exception as e:
+                logger.error(f"Bulk page {page_name} failed: {str(e)}")
+                errors.append({"student_id": student_id, "page": page_name, "error": str(e)})
+
+        # One recommendation per student over all of their pages
+        entries = []
+        unsaved = []
+        for student_id, page_data in pages_by_student.items():
+            structured_data = _merge_student_pages(student_id, page_data)
+            if not structured_data['records']:
+                errors.append({"student_id": student_id, "error": "No attendance records found"})
+                continue
+            try:
+                recommendations = attendance_calculator.calculate_allowed_skips(
+                    department,
+                    structured_data,
+                    desired_attendance,
+                    weeks_remaining
+                )
+            except Exception as e:
+                errors.append({"student_id": student_id, "error": str(e)})
+                continue
+            entry = (student_id, department, {
+                'attendance': structured_data,
+                'recommendations': recommendations
+            })
+            # A page whose Gemini stream broke off may be missing subjects
+            if any(extraction.get('partial') for extraction in extraction_by_student[student_id]):
+                unsaved.append(entry)
+            else:
+                entries.append(entry)
+
+        record_ids = attendance_record.save_records(entries)
+        for student_id, _, _ in entries:
+            get_chat_session_store().invalidate_context(student_id)
+
+        saved = list(zip(entries, record_ids)) + [(entry, None) for entry in unsaved]
+        return jsonify({
+            "success": bool(saved),
+            "data": [
+                {"student_id": student_id, "data": data, "record_id": record_id,
+                 "extraction": extraction_by_student[student_id]}
+                for (student_id, _, data), record_id in saved
+            ],
+            "errors": errors
+        })
+
+    except Exception as e:
+        logger.error(f"Error processing bulk request: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _run_analysis_job(job_id, params):
+    """Run the analysis pipeline for a queued job and record the outcome"""
+    global job_pending
+
+    job_store.update(job_id, status='running')
+    try:
+        result = _run_analysis(**params)
+        job_store.update(job_id, status='done', result=result)
+        logger.info(f"Analysis job {job_id} finished")
+    except Exception as e:
+        logger.error(f"Analysis job {job_id} failed: {str(e)}")
+        job_store.update(job_id, status='failed', error=str(e))
+    finally:
+        with job_pending_lock:
+            job_pending -= 1
+
+@ocr_bp.route('/analyze/jobs', methods=['POST','OPTIONS'])
+def submit_analysis_job():
+    """
+    Accept an attendance screenshot for background analysis and return a job id
+    """
+    global job_pending
+
+    try:
+        logger.info("Received attendance analysis job")
+
+        params, error_response = _parse_analysis_request()
+        if error_response:
+            return error_response
+
+        with job_pending_lock:
+            if job_pending >= job_max_pending:
+                response = jsonify({"success": False, "error": "Too many analysis jobs pending"})
+                response.headers['Retry-After'] = '5'
+                return response, 429
+            job_pending += 1
+
+        job_id = uuid.uuid4().hex
+        job_store.create(job_id, {
+            'student_id': params['student_id'],
+            'department': params['department']
+        })
+        job_executor.submit(_run_analysis_job, job_id, params)
+
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/api/analyze/jobs/{job_id}"
+        }), 202
+
+    except Exception as e:
+        logger.error(f"Error submitting analysis job: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@ocr_bp.route('/analyze/jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """
+    Get the status of an analysis job. Pass ?wait=<seconds> to long-poll until
+    the job finishes.
+    """
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    if not math.isfinite(wait):
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    wait = min(max(wait, 0.0), job_max_wait)
+
+    try:
+        job = job_store.wait(job_id, wait) if wait > 0 else job_store.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+
+        return jsonify({
+            "success": True,
+            "job": job
+        })
+    except Exception as e:
+        logger.error(f"Error fetching analysis job: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def _extraction_stats():
+    """Counts of extractions by source and the share that avoided Gemini"""
+    with extraction_counts_lock:
+        counts = dict(extraction_counts)
+    total = sum(counts.values())
+    return {
+        **counts,
+        'threshold': local_parse_threshold,
+        'geminiAvoidedRate': round((total - counts['gemini']) / total, 3) if total else 0.0
+    }
+
+@ocr_bp.route('/ocr/stats', methods=['GET'])
+def get_ocr_stats():
+    """Get OCR pipeline statistics"""
+    return jsonify({
+        "success": True,
+        "data": {
+            "mode": ocr_runner.mode,
+            "workers": ocr_workers,
+            "cascade": ocr_runner.get_cascade_stats(),
+            "resultCache": result_cache.get_stats(),
+            "llmCache": get_llm_cache().get_stats(),
+            "gemini": model_registry.get_gemini_stats(),
+            "geminiExtraction": gemini_processor.get_stats(),
+            "chatSessions": get_chat_session_store().get_stats(),
+            "admission": ocr_admission.get_stats(),
+            "extraction": _extraction_stats(),
+            "pendingJobs": job_pending
+        }
+    })
+
 @ocr_bp.route('/records/<student_id>', methods=['GET'])
 def get_student_records(student_id):
     """Get attendance records for a student"""
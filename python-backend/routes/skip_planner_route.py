@@ -1,9 +1,13 @@
 from flask import Blueprint, request, jsonify
 import logging
-import google.generativeai as genai
-import os
 import json
+import os
+import re
 from dotenv import load_dotenv
+from utils import model_registry
+from utils.llm_cache import get_llm_cache
+from utils.gemini_client import GeminiUnavailable
+from utils.skip_allocator import DISTRIBUTION_STRATEGIES, SkipAllocator
 
 # Load environment variables
 load_dotenv()
@@ -16,15 +20,19 @@ logger = logging.getLogger(__name__)
 # Create blueprint
 skip_planner_bp = Blueprint('skip_planner', __name__)
 
-# Initialize Gemini
-api_key = os.environ.get('GEMINI_API_KEY')
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-2.0-flash')
+skip_allocator = SkipAllocator()
+
+# Ask Gemini to write the reasoning text by default (requests can override with aiReasoning)
+ai_reasoning_default = os.environ.get('SKIP_PLANNER_AI_REASONING', 'false').lower() == 'true'
+
 
 @skip_planner_bp.route('/plan-skips', methods=['POST','OPTIONS'])
 def plan_skips():
     """
-    Endpoint to generate intelligent class skip recommendations using Gemini
+    Endpoint to distribute allowed class skips across subjects.
+
+    The distribution is computed locally by SkipAllocator; Gemini is only used,
+    when asked for, to write friendlier reasoning for that fixed distribution.
     """
     try:
         logger.info("Received skip planning request")
@@ -38,96 +46,104 @@ def plan_skips():
         subjects = request_data.get('subjects', [])
         allowed_skips = request_data.get('allowedSkips', 0)
         distribution_strategy = request_data.get('distributionStrategy', 'balanced')
+        ai_reasoning = bool(request_data.get('aiReasoning', ai_reasoning_default))
         
         if not subjects or not isinstance(subjects, list):
             return jsonify({"error": "Subjects array is required"}), 400
+
+        if distribution_strategy not in DISTRIBUTION_STRATEGIES:
+            return jsonify({
+                "error": f"distributionStrategy must be one of {', '.join(DISTRIBUTION_STRATEGIES)}"
+            }), 400
+
+        try:
+            result = skip_allocator.allocate(subjects, allowed_skips, distribution_strategy)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+
+        reasoning_source = 'local'
+        if ai_reasoning:
+            reasoning_source = _add_ai_reasoning(result, subjects, distribution_strategy)
+
+        return jsonify({
+            "success": True,
+            "data": result,
+            "reasoningSource": reasoning_source
+        })
         
-        # Build prompt for Gemini
-        prompt = f"""
-        I need to distribute {allowed_skips} allowed class skips across my subjects using a '{distribution_strategy}' strategy.
+    except Exception as e:
+        logger.error(f"Error planning skips: {str(e)}")
+        return jsonify({"error": str(e)}), 500 
+
+def _add_ai_reasoning(result, subjects, distribution_strategy):
+    """
+    Replace the local reasoning with Gemini's explanation of the same distribution
+
+    The skip counts are never changed. Any Gemini failure keeps the local text.
+
+    Returns:
+        str: 'gemini' if Gemini's reasoning was used, otherwise 'local'
+    """
+    model = model_registry.get_gemini_model()
+    if model is None:
+        return 'local'
+
+    prompt = f"""
+        These class skips have already been distributed across my subjects using a '{distribution_strategy}' strategy.
         
-        Here are my subjects with their current attendance and details:
+        Subjects:
         ```json
-        {json.dumps(subjects, indent=2)}
+        {json.dumps(subjects, sort_keys=True)}
         ```
         
-        For each subject, I need you to intelligently recommend how many classes I can skip while maintaining my attendance requirements.
-        
-        Strategy guidelines:
-        - 'balanced': Balance skips based on a combination of current attendance, weekly classes, and priority
-        - 'attendance': Give more skips to subjects with higher attendance percentages
-        - 'priority': Give more skips to subjects with lower priority (Low > Medium > High)
-        - 'classes': Give more skips to subjects with more weekly classes
+        Skips per subject id (fixed, do not change them):
+        ```json
+        {json.dumps(result['skipDistribution'], sort_keys=True)}
+        ```
         
-        Rules:
-        1. All skips must be assigned (total should equal {allowed_skips})
-        2. Never recommend more skips than a subject's weekly classes * 4 (one month)
-        3. For subjects with attendance below 75%, recommend fewer skips
-        4. For subjects with attendance above 90%, they can be given more skips
-        5. Consider subject priority in your distribution (High = attend more, Low = can skip more)
+        Rules that were applied: at most weekly classes * 4 skips per subject, fewer skips below 75% attendance,
+        more above 90%, and lower priority subjects (Low > Medium > High) can skip more.
         
         Return a JSON object with the following structure:
         ```json
         {{
-          "skipDistribution": {{
-            "subjectId1": numberOfSkips,
-            "subjectId2": numberOfSkips,
-            ...
-          }},
           "reasoning": {{
             "subjectId1": "brief explanation of the recommendation",
-            "subjectId2": "brief explanation of the recommendation",
             ...
           }},
-          "summary": "A brief overall explanation of the distribution strategy",
-          "totalSkips": {allowed_skips}
+          "summary": "A brief overall explanation of the distribution strategy"
         }}
         ```
         
         Return only the properly formatted JSON, with no additional text or markdown.
         """
-        
-        # Call Gemini API
-        logger.info("Calling Gemini API for skip planning")
-        response = model.generate_content(prompt)
-        
-        # Process the response
-        try:
-            # Extract JSON from the response
-            response_text = response.text.strip()
-            
-            # Handle markdown code blocks
-            if '```' in response_text:
-                # Extract content between code blocks
-                import re
-                match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', response_text)
-                if match:
-                    response_text = match.group(1).strip()
-            
-            # Parse JSON
-            result = json.loads(response_text)
-            
-            # Verify the result structure
-            required_keys = {'skipDistribution', 'reasoning', 'summary', 'totalSkips'}
-            if not all(key in result for key in required_keys):
-                return jsonify({
-                    "error": "Invalid response structure from AI",
-                    "raw_response": response_text
-                }), 500
-            
-            # Return the processed result
-            return jsonify({
-                "success": True,
-                "data": result
-            })
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse Gemini response as JSON: {e}")
-            return jsonify({
-                "error": "Failed to parse AI response",
-                "raw_response": response.text
-            }), 500
-        
+
+    logger.info("Calling Gemini API for skip planning reasoning")
+    try:
+        response_text = get_llm_cache().generate(model, prompt).strip()
+
+        # Handle markdown code blocks
+        if '```' in response_text:
+            match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', response_text)
+            if match:
+                response_text = match.group(1).strip()
+
+        explanation = json.loads(response_text)
+    except GeminiUnavailable as e:
+        logger.warning(f"Gemini unavailable for skip planning reasoning: {str(e)}")
+        return 'local'
     except Exception as e:
-        logger.error(f"Error planning skips: {str(e)}")
-        return jsonify({"error": str(e)}), 500 
+        logger.error(f"Failed to get skip planning reasoning from Gemini: {str(e)}")
+        return 'local'
+
+    reasoning = explanation.get('reasoning') if isinstance(explanation, dict) else None
+    if not isinstance(reasoning, dict):
+        return 'local'
+
+    # Only take text for known subjects, keep the local text for the rest
+    for subject_id in result['reasoning']:
+        if isinstance(reasoning.get(subject_id), str) and reasoning[subject_id].strip():
+            result['reasoning'][subject_id] = reasoning[subject_id].strip()
+    if isinstance(explanation.get('summary'), str) and explanation['summary'].strip():
+        result['summary'] = explanation['summary'].strip()
+    return 'gemini'
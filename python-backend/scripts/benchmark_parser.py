@@ -0,0 +1,190 @@
+import os
+import sys
+import re
+import time
+import random
+import logging
+import argparse
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.attendance_parser import SUBJECT_PREFIXES, parse_attendance_text, parse_attendance_texts
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class LegacyParser:
+    """The per-line parser that OCRProcessor used before the shared parser module"""
+
+    def __init__(self):
+        self.subject_prefixes = SUBJECT_PREFIXES
+
+    def extract_subject_code(self, text):
+        prefix_pattern = '|'.join(self.subject_prefixes)
+        patterns = [
+            rf'({prefix_pattern})[-\s]*(\d+[A-Z]?(?:\.\d+)?)',
+            rf'({prefix_pattern})\s*/\s*(\d+[A-Z]?(?:\.\d+)?)',
+            rf'({prefix_pattern})\s*-\s*(\d+[A-Z]?(?:\.\d+)?)',
+            rf'({prefix_pattern})\s+(\d+[A-Z]?(?:\.\d+)?)'
+        ]
+        for pattern in patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                prefix = match.group(1).upper()
+                code = match.group(2)
+                subject_code = f"{prefix}{code}"
+                full_name_match = re.search(rf'{prefix}\s*{code}\s*[-:]\s*([A-Za-z\s&]+)', text)
+                if full_name_match:
+                    return subject_code, f"{subject_code} - {full_name_match.group(1).strip()}"
+                return subject_code, subject_code
+
+        for prefix in self.subject_prefixes:
+            if prefix in text.upper():
+                idx = text.upper().find(prefix)
+                code_match = re.search(rf'{prefix}\s*(\d+[A-Z]?(?:\.\d+)?)', text[idx:idx+10], re.IGNORECASE)
+                if code_match:
+                    subject_code = f"{prefix}{code_match.group(1)}"
+                    return subject_code, subject_code
+
+        return None, None
+
+    def extract_attendance_numbers(self, text):
+        patterns = [
+            r'(\d+)\s*\/\s*(\d+)',
+            r'(\d+)\s*out\s*of\s*(\d+)',
+            r'attended\s*(\d+)\s*out\s*of\s*(\d+)',
+            r'present\s*(\d+)\s*total\s*(\d+)'
+        ]
+        for pattern in patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                return int(match.group(1)), int(match.group(2))
+        return None, None
+
+    def determine_class_type(self, text):
+        for indicator in ['lab', 'practical', 'practice', 'workshop', 'prac']:
+            if indicator.upper() in text.upper():
+                return "PRACTICAL"
+        return "THEORY"
+
+    def parse(self, text):
+        records = []
+        processed_subjects = set()
+        for line in text.split('\n'):
+            if not line.strip():
+                continue
+            subject_code, subject_name = self.extract_subject_code(line)
+            if not subject_code or subject_code in processed_subjects:
+                continue
+            class_type = self.determine_class_type(line)
+            attended, total = self.extract_attendance_numbers(line)
+            if attended is not None and total:
+                records.append({
+                    "subjectName": subject_name,
+                    "classType": class_type,
+                    "attended": attended,
+                    "total": total,
+                    "percentage": round((attended / total) * 100, 2)
+                })
+                processed_subjects.add(subject_code)
+        return records
+
+# Rows as they come out of real portal screenshots, including the shapes that
+# trip up a left-to-right scan (codes split across columns, "HSS", "Practice")
+REALISTIC_TEXTS = [
+    "\n".join([
+        "CHARUSAT Attendance Report",
+        "Course Code Type Present Total %",
+        "HS131.02A / HSS 12/15 80.00",
+        "HS111.03 HSS 20/22",
+        "CE262 Practice 12/15",
+        "IT355 - Computer Networks LECT 18/20 90.00",
+    ]),
+    "\n".join([
+        "Semester 4",
+        "IT356 / SNT LAB 14/16 87.50",
+        "CS 201 LAB 8 out of 10",
+        "MA-211 present 30 total 36 83.33%",
+        "CSE 301 Workshop 9/12 75.00",
+        "Page 1 of 1",
+    ]),
+]
+
+def check_parity(legacy, texts):
+    """Whether the shared parser, alone and batched, gives the legacy parser's records"""
+    matches = True
+    for text, batched in zip(texts, parse_attendance_texts(texts)):
+        expected = legacy.parse(text)
+        actual = parse_attendance_text(text)['records']
+        if actual != expected or batched['records'] != expected:
+            logger.error(f"Parser mismatch:\n{text}\nlegacy: {expected}\nshared: {actual}\n"
+                         f"batch: {batched['records']}")
+            matches = False
+    return matches
+
+def generate_texts(count, lines_per_text, seed=42):
+    """
+    Generate synthetic OCR texts that look like portal screenshots
+
+    A course code appears once per text: the legacy parser kept only the first
+    row of a code, so repeated codes would not compare like for like.
+    """
+    rng = random.Random(seed)
+    noise = ['Attendance Report', 'Semester 4', 'Course Code Type Present Total', 'Page 1 of 1', 'CHARUSAT']
+    texts = []
+    for _ in range(count):
+        lines = [rng.choice(noise)]
+        used_codes = set()
+        while len(used_codes) < lines_per_text:
+            prefix = rng.choice(SUBJECT_PREFIXES)
+            number = rng.randint(100, 399)
+            if (prefix, number) in used_codes:
+                continue
+            used_codes.add((prefix, number))
+            code = f"{number}{rng.choice(['', '', 'A', '.02'])}"
+            class_type = rng.choice(['LECT', 'LAB', 'THEORY', 'PRACTICAL'])
+            total = rng.randint(10, 40)
+            attended = rng.randint(0, total)
+            separator = rng.choice(['', ' ', '-', ' / '])
+            lines.append(f"{prefix}{separator}{code} {class_type} {attended}/{total} {attended / total * 100:.2f}")
+            if rng.random() < 0.3:
+                lines.append(rng.choice(noise))
+        texts.append('\n'.join(lines))
+    return texts
+
+def benchmark(label, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = (time.perf_counter() - start) / iterations
+    return label, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the attendance text parser")
+    parser.add_argument('--texts', type=int, default=500, help="Number of synthetic OCR texts")
+    parser.add_argument('--lines', type=int, default=12, help="Subject rows per text")
+    parser.add_argument('--iterations', type=int, default=5, help="Timed iterations per parser")
+    args = parser.parse_args()
+
+    texts = generate_texts(args.texts, args.lines)
+    total_lines = sum(text.count('\n') + 1 for text in texts)
+    legacy = LegacyParser()
+    # The timed corpus and the hand-picked rows must both parse like the legacy parser
+    if not check_parity(legacy, REALISTIC_TEXTS + texts):
+        sys.exit(1)
+
+    results = [
+        benchmark('legacy per-line regexes', lambda: [legacy.parse(text) for text in texts], args.iterations),
+        benchmark('shared parser', lambda: [parse_attendance_text(text) for text in texts], args.iterations),
+        benchmark('shared parser (batch)', lambda: parse_attendance_texts(texts), args.iterations),
+    ]
+
+    baseline = results[0][1]
+    logger.info(f"Parsed {len(texts)} texts / {total_lines} lines per iteration")
+    for label, elapsed in results:
+        logger.info(f"{label:<26} {elapsed * 1000:9.2f} ms  {total_lines / elapsed:12,.0f} lines/s  "
+                    f"{baseline / elapsed:5.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+# Add the parent directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ocr_processor import OCRProcessor
+from utils.attendance_parser import parse_attendance_text
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+def load_corpus(corpus_dir):
+    """
+    Load sample screenshots and their optional ground truth
+
+    A screenshot `name.png` may have a `name.json` next to it holding the
+    expected `records` (as returned by /api/analyze under data.attendance).
+    """
+    corpus = []
+    for filename in sorted(os.listdir(corpus_dir)):
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+
+        path = os.path.join(corpus_dir, filename)
+        truth_path = os.path.splitext(path)[0] + '.json'
+        expected = None
+        if os.path.exists(truth_path):
+            with open(truth_path) as f:
+                expected = json.load(f)['records']
+        corpus.append((path, expected))
+    return corpus
+
+def record_keys(records):
+    """Reduce records to comparable (subject, class type, attended, total) tuples"""
+    return {
+        (record['subjectName'].split(' ')[0].split('/')[0].strip().upper(),
+         record['classType'], int(record['attended']), int(record['total']))
+        for record in records
+    }
+
+def score(found, expected):
+    """Precision and recall of found records against the expected ones"""
+    if not expected:
+        return (1.0 if not found else 0.0), 1.0
+    matched = len(found & expected)
+    precision = matched / len(found) if found else 0.0
+    recall = matched / len(expected)
+    return precision, recall
+
+def run_backend(backend, mode, corpus):
+    processor = OCRProcessor(mode=mode, backend=backend)
+    processor._initialize_reader()
+
+    # Warm the backend up so model loading is not timed
+    processor.process_image(corpus[0][0])
+
+    latencies = []
+    outputs = []
+    for path, _ in corpus:
+        start = time.perf_counter()
+        text = processor.process_image(path)
+        latencies.append(time.perf_counter() - start)
+        outputs.append(record_keys(parse_attendance_text(text)['records']))
+    return latencies, outputs
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare OCR backends on sample attendance screenshots")
+    parser.add_argument('corpus', help="Directory of screenshots with optional <name>.json ground truth")
+    parser.add_argument('--backends', default='easyocr,easyocr-int8',
+                        help="Comma-separated backends; the first is the reference when ground truth is missing")
+    parser.add_argument('--mode', default=os.environ.get('OCR_MODE', 'multi_pass'), help="OCR mode to run")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        logger.error(f"No screenshots found in {args.corpus}")
+        sys.exit(1)
+
+    backends = [name.strip() for name in args.backends.split(',') if name.strip()]
+    reference_outputs = None
+
+    logger.info(f"Comparing {backends} on {len(corpus)} screenshots in '{args.mode}' mode")
+    for backend in backends:
+        latencies, outputs = run_backend(backend, args.mode, corpus)
+        if reference_outputs is None:
+            reference_outputs = outputs
+
+        precisions, recalls = [], []
+        for (_, expected), found, reference in zip(corpus, outputs, reference_outputs):
+            expected_keys = record_keys(expected) if expected is not None else reference
+            precision, recall = score(found, expected_keys)
+            precisions.append(precision)
+            recalls.append(recall)
+
+        latencies_sorted = sorted(latencies)
+        p50 = latencies_sorted[len(latencies_sorted) // 2]
+        p95 = latencies_sorted[min(len(latencies_sorted) - 1, int(len(latencies_sorted) * 0.95))]
+        logger.info(
+            f"{backend:<14} p50 {p50 * 1000:8.1f} ms  p95 {p95 * 1000:8.1f} ms  "
+            f"precision {sum(precisions) / len(precisions):.3f}  recall {sum(recalls) / len(recalls):.3f}"
+        )
+
+if __name__ == "__main__":
+    main()
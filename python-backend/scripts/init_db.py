@@ -30,6 +30,11 @@ def create_indexes():
             ('created_at', -1)
         ])
         db.attendance_records.create_index('department')
+
+        # Expire cached analysis results automatically
+        db.analysis_cache.create_index('expires_at', expireAfterSeconds=0)
+        db.analysis_jobs.create_index('expires_at', expireAfterSeconds=0)
+        db.llm_cache.create_index('expires_at', expireAfterSeconds=0)
         
         logger.info("Successfully created database indexes")
         
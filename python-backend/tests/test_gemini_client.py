@@ -0,0 +1,184 @@
+import threading
+import time
+
+import pytest
+
+from utils.fake_gemini import FakeGeminiError, FakeGeminiModel, FakeGeminiResponse
+from utils.gemini_client import CircuitOpenError, GeminiClient, GeminiTimeout, GeminiUnavailable
+
+class ScriptedFakeModel(FakeGeminiModel):
+    """FakeGeminiModel whose calls follow a script of latencies and errors, then behave normally"""
+
+    def __init__(self, script, **kwargs):
+        super().__init__(**kwargs)
+        self.script = list(script)
+        self._script_lock = threading.Lock()
+
+    def generate_content(self, prompt, **kwargs):
+        with self._script_lock:
+            step = self.script.pop(0) if self.script else None
+        if step is None:
+            return super().generate_content(prompt, **kwargs)
+
+        self.calls += 1
+        if isinstance(step, Exception):
+            raise step
+        time.sleep(step / 1000)
+        return FakeGeminiResponse(self.response_text)
+
+def make_client(model, **kwargs):
+    options = {
+        'deadline_seconds': 2,
+        'max_retries': 2,
+        'backoff_ms': 1,
+        'max_backoff_ms': 1,
+        'breaker_failures': 100,
+        'breaker_reset_seconds': 0.05,
+    }
+    options.update(kwargs)
+    return GeminiClient(model, **options)
+
+def test_returns_the_model_response():
+    client = make_client(FakeGeminiModel(response_text='hello'))
+
+    assert client.generate_content('hi').text == 'hello'
+    stats = client.get_stats()
+    assert stats['calls'] == 1
+    assert stats['retries'] == 0
+    assert stats['p50Ms'] is not None
+
+def test_retries_a_failed_call():
+    model = ScriptedFakeModel([FakeGeminiError('boom')], response_text='ok')
+    client = make_client(model)
+
+    assert client.generate_content('hi').text == 'ok'
+    assert model.calls == 2
+    assert client.get_stats()['retries'] == 1
+
+def test_gives_up_after_max_retries():
+    model = FakeGeminiModel(failure_rate=1)
+    client = make_client(model, max_retries=2)
+
+    with pytest.raises(GeminiUnavailable):
+        client.generate_content('hi')
+    assert model.calls == 3
+    assert client.get_stats()['failures'] == 1
+
+def test_does_not_retry_non_retryable_errors():
+    model = ScriptedFakeModel([ValueError('bad request')])
+    client = make_client(model, breaker_failures=1)
+
+    with pytest.raises(ValueError):
+        client.generate_content('hi')
+    assert model.calls == 1
+    # Caller errors don't count towards opening the breaker
+    assert client.get_stats()['breaker'] == 'closed'
+
+def test_retry_budget_caps_retries_during_an_outage():
+    model = FakeGeminiModel(failure_rate=1)
+    client = make_client(model, max_retries=2, retry_budget=0)
+
+    # The budget starts with 10 tokens and earns none, so only 10 retries happen
+    for _ in range(8):
+        with pytest.raises(GeminiUnavailable):
+            client.generate_content('hi')
+
+    assert client.get_stats()['retries'] == 10
+    assert model.calls == 8 + 10
+
+def test_deadline_bounds_a_slow_call():
+    client = make_client(FakeGeminiModel(latency_ms=500), max_retries=0)
+
+    start = time.monotonic()
+    with pytest.raises(GeminiTimeout):
+        client.generate_content('hi', deadline=0.1)
+    assert time.monotonic() - start < 0.3
+    assert client.get_stats()['timeouts'] == 1
+
+def test_stream_deadline_bounds_a_stalled_stream():
+    model = FakeGeminiModel(response_text='one two three four five six seven eight', latency_ms=600)
+    client = make_client(model, max_retries=0)
+
+    start = time.monotonic()
+    with pytest.raises(GeminiTimeout):
+        list(client.stream_content('hi', deadline=0.1))
+    assert time.monotonic() - start < 0.3
+
+def test_stream_yields_every_chunk():
+    client = make_client(FakeGeminiModel(response_text='one two three four five six seven eight'))
+
+    assert ''.join(client.stream_content('hi')) == 'one two three four five six seven eight'
+
+def test_hedges_a_call_slower_than_the_percentile():
+    # Three fast calls set the latency percentile, then the first attempt stalls
+    model = ScriptedFakeModel([10, 10, 10, 1000, 10], response_text='ok')
+    client = make_client(model, hedge_percentile=50, hedge_min_samples=3)
+    for _ in range(3):
+        client.generate_content('hi')
+
+    start = time.monotonic()
+    assert client.generate_content('hi').text == 'ok'
+    assert time.monotonic() - start < 0.5
+    assert client.get_stats()['hedges'] == 1
+
+def test_breaker_opens_after_consecutive_failures():
+    model = FakeGeminiModel(failure_rate=1)
+    client = make_client(model, max_retries=0, breaker_failures=2, breaker_reset_seconds=60)
+
+    for _ in range(2):
+        with pytest.raises(GeminiUnavailable):
+            client.generate_content('hi')
+
+    with pytest.raises(CircuitOpenError):
+        client.generate_content('hi')
+    assert model.calls == 2
+    stats = client.get_stats()
+    assert stats['breaker'] == 'open'
+    assert stats['shortCircuited'] == 1
+
+def test_breaker_closes_after_a_successful_probe():
+    model = FakeGeminiModel(failure_rate=1)
+    client = make_client(model, max_retries=0, breaker_failures=1)
+    with pytest.raises(GeminiUnavailable):
+        client.generate_content('hi')
+    assert client.get_stats()['breaker'] == 'open'
+
+    time.sleep(0.06)
+    model.failure_rate = 0
+    client.generate_content('hi')
+
+    assert client.get_stats()['breaker'] == 'closed'
+    client.generate_content('hi')
+
+def test_breaker_reopens_when_the_probe_fails():
+    model = FakeGeminiModel(failure_rate=1)
+    client = make_client(model, max_retries=0, breaker_failures=1)
+    with pytest.raises(GeminiUnavailable):
+        client.generate_content('hi')
+
+    time.sleep(0.06)
+    with pytest.raises(GeminiUnavailable):
+        client.generate_content('hi')
+
+    assert client.get_stats()['breaker'] == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.generate_content('hi')
+    assert model.calls == 2
+
+def test_half_open_breaker_lets_a_single_probe_through():
+    model = ScriptedFakeModel([FakeGeminiError('boom'), 300], response_text='ok')
+    client = make_client(model, max_retries=0, breaker_failures=1)
+    with pytest.raises(GeminiUnavailable):
+        client.generate_content('hi')
+    time.sleep(0.06)
+
+    probe = threading.Thread(target=client.generate_content, args=('probe',))
+    probe.start()
+    time.sleep(0.05)
+    # While the probe is in flight, other calls still fail fast
+    with pytest.raises(CircuitOpenError):
+        client.generate_content('hi')
+    probe.join()
+
+    assert client.get_stats()['breaker'] == 'closed'
+    assert model.calls == 2
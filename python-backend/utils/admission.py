@@ -0,0 +1,108 @@
+import math
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted to a bounded stage"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Bounded admission queue in front of an expensive stage.
+
+    At most `max_concurrent` callers run the stage at once and at most
+    `max_queue` wait for a slot. A caller that finds the queue full is rejected
+    immediately (429), and a caller still waiting after `deadline_seconds` is
+    rejected with 503. Both carry a Retry-After estimate based on recent
+    service times.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, deadline_seconds: float, name: str = 'stage'):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.deadline_seconds = deadline_seconds
+        self.name = name
+
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._admitted = 0
+        self._rejected_full = 0
+        self._rejected_timeout = 0
+        self._last_wait = 0.0
+        self._avg_wait = 0.0
+        self._avg_service = 1.0
+
+    @contextmanager
+    def admit(self):
+        """
+        Wait for a slot and hold it for the duration of the block
+
+        Yields:
+            float: Seconds spent waiting in the queue
+        """
+        start = time.monotonic()
+
+        with self._condition:
+            if self._active >= self.max_concurrent or self._waiting:
+                if self._waiting >= self.max_queue:
+                    self._rejected_full += 1
+                    raise AdmissionRejected(f"{self.name} queue is full", 429, self._retry_after())
+
+                self._waiting += 1
+                try:
+                    deadline = start + self.deadline_seconds
+                    while self._active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._rejected_timeout += 1
+                            raise AdmissionRejected(f"Timed out waiting for {self.name}", 503,
+                                                    self._retry_after())
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._active += 1
+            self._admitted += 1
+            wait = time.monotonic() - start
+            self._last_wait = wait
+            self._avg_wait = 0.8 * self._avg_wait + 0.2 * wait
+
+        started = time.monotonic()
+        try:
+            yield wait
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._avg_service = 0.8 * self._avg_service + 0.2 * (time.monotonic() - started)
+                self._condition.notify()
+
+    def _retry_after(self) -> int:
+        """Estimate seconds until the current queue drains (caller holds the lock)"""
+        backlog = self._waiting + self._active
+        return max(1, math.ceil(self._avg_service * backlog / self.max_concurrent))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, wait times and rejection counters"""
+        with self._condition:
+            return {
+                'active': self._active,
+                'queueDepth': self._waiting,
+                'maxConcurrent': self.max_concurrent,
+                'maxQueue': self.max_queue,
+                'admitted': self._admitted,
+                'rejectedQueueFull': self._rejected_full,
+                'rejectedTimeout': self._rejected_timeout,
+                'lastWaitMs': round(self._last_wait * 1000, 1),
+                'avgWaitMs': round(self._avg_wait * 1000, 1),
+                'avgServiceMs': round(self._avg_service * 1000, 1)
+            }
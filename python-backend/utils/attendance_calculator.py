@@ -1,7 +1,7 @@
 import json
 import os
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from models.weekly_schedule import WeeklySchedule
 
 logger = logging.getLogger(__name__)
@@ -11,17 +11,18 @@ class AttendanceCalculator:
         self.weekly_schedule = WeeklySchedule()
 
     def calculate_allowed_skips(self, department: str, attendance_data: Dict[str, Any], 
-                              desired_percentage: float, weeks_remaining: int) -> Dict[str, Any]:
+                              desired_percentage: float, weeks_remaining: int,
+                              department_schedule: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Calculate allowed skips and generate recommendations based on attendance data
+
+        Pass department_schedule to reuse an already loaded schedule, e.g. when
+        recalculating as streamed records arrive.
         """
         try:
             # Get department schedule from database
-            try:
-                department_schedule = self.weekly_schedule.get_department_schedule(department)
-            except ValueError as e:
-                logger.error(f"Department schedule error: {str(e)}")
-                raise
+            if department_schedule is None:
+                department_schedule = self.get_department_schedule(department)
 
             # Extract summary
             total_attended = sum(record['attended'] for record in attendance_data['records'])
@@ -112,6 +113,14 @@ class AttendanceCalculator:
             logger.error(f"Error calculating allowed skips: {str(e)}")
             raise
 
+    def get_department_schedule(self, department: str) -> Dict[str, Any]:
+        """Load a department's weekly schedule, raising ValueError if there is none"""
+        try:
+            return self.weekly_schedule.get_department_schedule(department)
+        except ValueError as e:
+            logger.error(f"Department schedule error: {str(e)}")
+            raise
+
     def _get_recommendation(self, lecture_percent: float, lab_percent: float,
                           cannot_miss: bool) -> str:
         """Generate recommendation based on attendance percentages"""
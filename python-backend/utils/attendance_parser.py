@@ -0,0 +1,260 @@
+import re
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Common subject code prefixes in engineering colleges
+SUBJECT_PREFIXES = [
+    'HS', 'IT', 'MA', 'CSE', 'CS', 'EC', 'DS', 'WT', 'ME', 'CE', 'EE', 'CH', 'PH',
+    'BT', 'MT', 'AE', 'PE', 'IE', 'SE', 'AI', 'ML', 'IOT', 'CY', 'HU', 'SS'
+]
+
+# Words that mark a row as a lab/practical session ('prac' covers practical/practice)
+PRACTICAL_INDICATORS = ['lab', 'practical', 'practice', 'workshop', 'prac']
+
+# One pass over a line finds the subject code, the attendance pair and any
+# practical marker. Patterns are compiled once at import time. A subject code
+# must start a word, so "SS" in "HSS 12/15" or "ce" in "Practice 12/15" is not
+# taken for a code that swallows the attendance numbers.
+_LINE_PATTERN = re.compile(
+    r'(?<![A-Za-z])(?P<prefix>' + '|'.join(SUBJECT_PREFIXES) + r')'
+    r'(?:\s*[-/]\s*|\s*)(?P<code>\d+[A-Z]?(?:\.\d+)?)'   # CS101, CS-101, CS/101, CS 101
+    r'|(?P<attended>\d+)\s*/\s*(?P<total>\d+)'           # 12/15
+    r'|(?P<attended_words>\d+)\s*out\s*of\s*(?P<total_words>\d+)'  # 12 out of 15
+    r'|present\s*(?P<present>\d+)\s*total\s*(?P<present_total>\d+)'  # present 12 total 15
+    r'|(?P<percent>\d{1,3}\.\d{1,2}|\d{1,3}(?=\s*%))'    # 80.00 or 80%
+    r'|(?P<practical>lab|prac|workshop)',
+    re.IGNORECASE
+)
+
+# Optional subject title following a code, e.g. "IT355 - Computer Networks"
+_TITLE_PATTERN = re.compile(r'\s*[-:]\s*([A-Za-z][A-Za-z\s&]*)')
+
+_PRACTICAL_PATTERN = re.compile(r'lab|prac|workshop', re.IGNORECASE)
+
+# Attendance pair on its own, for lines where the single pass found none
+_PAIR_PATTERN = re.compile(
+    r'(\d+)\s*/\s*(\d+)|(\d+)\s*out\s*of\s*(\d+)|present\s*(\d+)\s*total\s*(\d+)',
+    re.IGNORECASE
+)
+
+def parse_line(line: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse a single OCR line in one scan
+
+    Args:
+        line: One line of OCR text
+
+    Returns:
+        dict: subjectCode, subjectName, classType, attended, total and the
+              percentage printed on the line (attended/total/percentage are
+              None when missing), or None if the line has no subject code
+    """
+    subject_code = None
+    subject_name = None
+    attended = None
+    total = None
+    percentage = None
+    practical = False
+
+    for match in _LINE_PATTERN.finditer(line):
+        group = match.lastgroup
+
+        if group == 'code':
+            if subject_code is None:
+                subject_code = f"{match.group('prefix').upper()}{match.group('code')}"
+                subject_name = subject_code
+
+                # Pick up a trailing subject title if there is one
+                title_match = _TITLE_PATTERN.match(line, match.end())
+                if title_match:
+                    title = title_match.group(1).strip()
+                    subject_name = f"{subject_code} - {title}"
+                    practical = practical or bool(_PRACTICAL_PATTERN.search(title))
+        elif group == 'practical':
+            practical = True
+        elif group == 'percent':
+            if percentage is None:
+                percentage = float(match.group('percent'))
+        elif attended is None:
+            if group == 'total':
+                attended, total = match.group('attended'), match.group('total')
+            elif group == 'total_words':
+                attended, total = match.group('attended_words'), match.group('total_words')
+            elif group == 'present_total':
+                attended, total = match.group('present'), match.group('present_total')
+
+    if subject_code is None:
+        return None
+
+    if attended is None:
+        # A later code-like match can still overlap the pair, look for it on its own
+        pair_match = _PAIR_PATTERN.search(line)
+        if pair_match:
+            attended, total = [group for group in pair_match.groups() if group is not None]
+
+    return {
+        'subjectCode': subject_code,
+        'subjectName': subject_name,
+        'classType': 'PRACTICAL' if practical else 'THEORY',
+        'attended': int(attended) if attended is not None else None,
+        'total': int(total) if total is not None else None,
+        'percentage': percentage
+    }
+
+def parse_attendance_text(text: str, student_id: str = 'unknown', codes_only: bool = False) -> Dict[str, Any]:
+    """
+    Parse OCR text into structured attendance data
+
+    Each subject and class type is recorded once, from the first line that has
+    both a subject code and an attendance pair.
+
+    Args:
+        text: The OCR extracted text
+        student_id: Student ID to put on the result
+        codes_only: Use the bare course code as subjectName, as Gemini does,
+                    instead of including a trailing subject title
+
+    Returns:
+        dict: Structured attendance data with student_id, records and overallPercentage
+    """
+    return _parse_text(text, student_id, codes_only, parse_line)
+
+def _parse_text(text: str, student_id: str, codes_only: bool,
+                parse: Callable[[str], Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """parse_attendance_text with the line parser passed in"""
+    records = []
+    total_attended = 0
+    total_classes = 0
+    processed_subjects = set()  # To avoid duplicates
+
+    for line in text.split('\n'):
+        if not line.strip():
+            continue
+
+        parsed = parse(line)
+        if parsed is None or parsed['attended'] is None or not parsed['total']:
+            continue
+
+        subject_key = (parsed['subjectCode'], parsed['classType'])
+        if subject_key in processed_subjects:
+            continue
+        processed_subjects.add(subject_key)
+
+        attended = parsed['attended']
+        total = parsed['total']
+        records.append({
+            "subjectName": parsed['subjectCode'] if codes_only else parsed['subjectName'],
+            "classType": parsed['classType'],
+            "attended": attended,
+            "total": total,
+            "percentage": round((attended / total) * 100, 2)
+        })
+
+        total_attended += attended
+        total_classes += total
+
+    # Calculate overall percentage
+    overall_percentage = round((total_attended / total_classes) * 100, 2) if total_classes > 0 else 0
+
+    return {
+        "student_id": student_id,
+        "records": records,
+        "overallPercentage": overall_percentage
+    }
+
+def parse_attendance_texts(texts: Iterable[str], student_id: str = 'unknown',
+                           codes_only: bool = False) -> List[Dict[str, Any]]:
+    """
+    Parse many OCR texts at once
+
+    Lines are parsed once per batch: headers, footers and rows repeated across
+    screenshots (e.g. overlapping pages of one student) reuse the first parse.
+
+    Args:
+        texts: OCR extracted texts
+        student_id: Student ID to put on every result
+        codes_only: Same as for parse_attendance_text
+
+    Returns:
+        list: Structured attendance data for each text, in order
+    """
+    parsed_lines = {}
+
+    def parse(line):
+        if line not in parsed_lines:
+            parsed_lines[line] = parse_line(line)
+        return parsed_lines[line]
+
+    return [_parse_text(text, student_id, codes_only, parse) for text in texts]
+
+def score_local_parse(text: str, result: Dict[str, Any],
+                      department_courses: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Score how far a local parse can be trusted without asking Gemini
+
+    The score is the lowest of three checks, so a strong result on one check
+    cannot hide a weak one (e.g. a dropped row behind perfect course matches):
+    - coverage: share of subject rows (lines with a subject code) that produced a record
+    - consistency: share of records with attended <= total whose printed
+      percentage, when present, matches attended/total
+    - courseMatch: share of records whose course code is exactly one of the
+      department's weekly schedule codes (skipped if the schedule is unknown)
+
+    Args:
+        text: The OCR extracted text
+        result: Output of parse_attendance_text for the same text
+        department_courses: Course keys of the department schedule, e.g. "IT355 / SNT"
+
+    Returns:
+        dict: score between 0 and 1 and the individual checks
+    """
+    records = result['records']
+    if not records:
+        return {'score': 0.0, 'coverage': 0.0, 'consistency': 0.0, 'courseMatch': None}
+
+    candidate_rows = set()
+    consistent = 0
+    for line in text.split('\n'):
+        parsed = parse_line(line)
+        if parsed is None:
+            continue
+        subject_key = (parsed['subjectCode'], parsed['classType'])
+        candidate_rows.add(subject_key)
+
+        attended, total = parsed['attended'], parsed['total']
+        if attended is None or not total:
+            continue
+        if attended <= total and (
+            parsed['percentage'] is None
+            or abs(parsed['percentage'] - attended / total * 100) <= 1.0
+        ):
+            consistent += 1
+
+    coverage = min(1.0, len(records) / len(candidate_rows)) if candidate_rows else 0.0
+    consistency = min(1.0, consistent / len(records))
+    checks = [coverage, consistency]
+
+    course_match = None
+    if department_courses:
+        # Schedule keys go through the same code parser, so "HS131.02A / HSS"
+        # compares as HS131.02 like the OCR rows; a truncated code never matches
+        course_codes = set()
+        for course in department_courses:
+            parsed = parse_line(course.split('/')[0].strip())
+            if parsed is not None:
+                course_codes.add(parsed['subjectCode'])
+        matched = sum(
+            1 for record in records
+            if record['subjectName'].split(' ')[0].upper() in course_codes
+        )
+        course_match = matched / len(records)
+        checks.append(course_match)
+
+    return {
+        'score': round(min(checks), 3),
+        'coverage': round(coverage, 3),
+        'consistency': round(consistency, 3),
+        'courseMatch': round(course_match, 3) if course_match is not None else None
+    }
@@ -0,0 +1,110 @@
+import copy
+import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+def content_key(data: bytes) -> str:
+    """Build a content-addressed cache key from raw bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with size and TTL eviction"""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a value, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, evicting the least recently used entries if full"""
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+class TieredCache:
+    """
+    Two-tier cache: an in-process LRU in front of an optional persistent store.
+
+    The persistent store only needs `get(key)` and `set(key, value)`. Values are
+    deep-copied on the way in and out so callers can mutate what they get back.
+    """
+
+    def __init__(self, memory: LRUCache, persistent=None, name: str = 'cache'):
+        self.memory = memory
+        self.persistent = persistent
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Look a key up in memory, then in the persistent tier"""
+        value = self.memory.get(key)
+
+        if value is None and self.persistent is not None:
+            try:
+                value = self.persistent.get(key)
+            except Exception as e:
+                logger.error(f"{self.name} persistent lookup failed: {str(e)}")
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value in both tiers"""
+        value = copy.deepcopy(value)
+        self.memory.set(key, value)
+
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, value)
+            except Exception as e:
+                logger.error(f"{self.name} persistent write failed: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit and miss counters"""
+        with self._stats_lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self.memory),
+                'persistent': self.persistent is not None
+            }
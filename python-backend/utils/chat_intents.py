@@ -0,0 +1,308 @@
+import math
+import random
+import re
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGET = 75
+# Points above the target at which attendance counts as comfortably good
+GOOD_MARGIN = 10
+# Points below the target that still count as within reach
+CLOSE_MARGIN = 5
+
+_SUBJECT_PATTERN = re.compile(r'\b([A-Z]{2,4})-?(\d{3}[A-Z]?(?:\.\d+)?)\b', re.IGNORECASE)
+# A subject question without one of the intents below must ask how the subject stands
+_SUBJECT_QUESTION_PATTERN = re.compile(
+    r'\bhow\s+(?:am\s+i|is|are)\b.*\b(?:doing|going)\b|\b(?:stats|status)\b', re.IGNORECASE)
+# A percentage is only a target when phrased as one ("to stay above 80%", "for 80%");
+# "I'm at 70%" states the current figure
+_TARGET_PATTERN = re.compile(
+    r'\b(?:stay|remain|be|keep\s+it|get|reach|hit|maintain|above|over|below|under|least|for|'
+    r'target(?:\s+of)?)\s+(?:at\s+least\s+|at\s+|above\s+|over\s+|to\s+)?'
+    r'(\d{1,3}(?:\.\d+)?)\s*(?:%|percent)', re.IGNORECASE)
+# Questions about one kind of class; records store THEORY or PRACTICAL
+_CLASS_TYPE_PATTERNS = [
+    ('PRACTICAL', re.compile(r'\b(?:labs?|practicals?|pracs?)\b', re.IGNORECASE)),
+    ('THEORY', re.compile(r'\b(?:lectures?|theory)\b', re.IGNORECASE)),
+]
+_CLASS_TYPE_LABELS = {'PRACTICAL': 'labs', 'THEORY': 'lectures'}
+
+# Order matters: the first matching intent wins
+_INTENT_PATTERNS = [
+    ('after_missing', re.compile(
+        r'\b(?:if|after)\b.*\b(?:miss|skip|bunk)\w*\s+(?P<count>\d+)\s*(?:more\s+)?'
+        r'(?:class|lecture|lab|session)', re.IGNORECASE)),
+    ('can_miss', re.compile(
+        r'how\s+many\s+(?:more\s+)?(?:class|lecture|lab|session)\w*\s+(?:can|could|may)\s+i\s+'
+        r'(?:miss|skip|bunk|leave)', re.IGNORECASE)),
+    ('classes_needed', re.compile(
+        r'how\s+many\s+(?:more\s+)?(?:class|lecture|lab|session)\w*\s+(?:do|should|must)\s+i\s+'
+        r'(?:need\s+to\s+|have\s+to\s+)?attend', re.IGNORECASE)),
+    ('total_classes', re.compile(
+        r'how\s+many\s+(?:total\s+)?(?:class|lecture|session)\w*\s+(?:have\s+been\s+|were\s+|are\s+)?'
+        r'(?:conducted|held|taken\s+place|so\s+far|in\s+total)', re.IGNORECASE)),
+    # Only the whole question "what is my attendance" and the like; open questions
+    # that merely mention attendance ("how do I improve my attendance") go to Gemini
+    ('current_percentage', re.compile(
+        r'^\s*(?:(?:what\s*(?:\'s|is)|show(?:\s+me)?|tell\s+me)\s+)?my\s+(?:current\s+|overall\s+)?'
+        r'(?:attendance(?:\s+percentage)?|percentage)'
+        r'(?:\s+(?:in|for)\s+[A-Z]{2,4}-?\d{3}\S*)?(?:\s+(?:now|right\s+now|so\s+far))?'
+        r'(?:\s+for\s+\d{1,3}(?:\.\d+)?\s*(?:%|percent))?\s*[?.!]*\s*$',
+        re.IGNORECASE)),
+]
+
+# Personality templates by attendance tier; {fields} are filled with exact numbers
+TEMPLATES = {
+    'can_miss': {
+        'good': [
+            "Look at you! With {attended}/{total} ({percentage}%) {scope}, you can miss {count} more classes and still stay at {target}%. Use them wisely, legend 😎",
+            "{percentage}% {scope}? Flex. You've got {count} classes of breathing room before you drop below {target}%.",
+        ],
+        'borderline': [
+            "You're at {percentage}% {scope} ({attended}/{total}). You can miss {count} more classes before slipping under {target}%. Tread carefully 👀",
+            "Living on the edge at {percentage}% {scope}! {count} more missed classes is all you get before {target}% waves goodbye.",
+        ],
+        'poor': [
+            "Yikes, {percentage}% {scope} ({attended}/{total}). You can miss {count} classes right now. Zero. Time to make friends with the front row 🪑",
+            "At {percentage}% {scope}, the answer is {count}. The attendance register misses you. Go say hi.",
+        ],
+    },
+    'after_missing': {
+        'good': [
+            "If you miss {count} more classes, your attendance {scope} goes from {percentage}% to {new_percentage}% ({attended}/{new_total}). {verdict}",
+        ],
+        'borderline': [
+            "Missing {count} more classes takes your attendance {scope} from {percentage}% to {new_percentage}% ({attended}/{new_total}). {verdict}",
+        ],
+        'poor': [
+            "You're already at {percentage}% {scope}, and missing {count} more drags it to {new_percentage}% ({attended}/{new_total}). {verdict}",
+        ],
+    },
+    'classes_needed': {
+        'good': [
+            "Relax, you're already at {percentage}% {scope}, above {target}%. Zero classes needed. Show-off 😏",
+        ],
+        'borderline': [
+            "You need to attend {count} classes in a row to go from {percentage}% {scope} to {target}%. Set those alarms ⏰",
+        ],
+        'poor': [
+            "Buckle up: {count} consecutive classes to drag you from {percentage}% {scope} up to {target}%. The comeback arc starts tomorrow 💪",
+        ],
+    },
+    'current_percentage': {
+        'good': [
+            "You're at {percentage}% {scope} ({attended}/{total}). Your professors probably know your name and everything! 🌟{breakdown}",
+        ],
+        'borderline': [
+            "You're sitting at {percentage}% {scope} ({attended}/{total}). Not bad, not bulletproof.{breakdown}",
+        ],
+        'poor': [
+            "Brace yourself: {percentage}% {scope} ({attended}/{total}). Campus security might forget your face soon 😬{breakdown}",
+        ],
+    },
+    'total_classes': {
+        'any': [
+            "{total} classes have been conducted so far, and you attended {attended} of them ({percentage}%).{breakdown}",
+        ],
+    },
+    'subject_stats': {
+        'good': [
+            "{subject}: {attended}/{total} classes ({percentage}%).{by_type}\nComfortably above {target}%, teacher's pet energy 🍎",
+        ],
+        'borderline': [
+            "{subject}: {attended}/{total} classes ({percentage}%).{by_type}\nAbove {target}%, but don't get cocky.",
+        ],
+        'poor': [
+            "{subject}: {attended}/{total} classes ({percentage}%).{by_type}\n{below} below {target}%. This subject needs you back ASAP 🚨",
+        ],
+    },
+}
+
+def _tier(percentage: float, target: float = DEFAULT_TARGET) -> str:
+    if percentage < target:
+        return 'poor'
+    if percentage >= target + GOOD_MARGIN:
+        return 'good'
+    return 'borderline'
+
+def _render(intent: str, tier: str, **fields) -> str:
+    templates = TEMPLATES[intent]
+    return random.choice(templates.get(tier) or templates['any']).format(**fields)
+
+def _format_percentage(value: float) -> str:
+    return f"{value:.2f}"
+
+def _records_from(attendance_data: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Usable records from a stored attendance document"""
+    if not attendance_data:
+        return []
+    records = (attendance_data.get('attendance_data') or {}).get('records') or []
+    usable = []
+    for record in records:
+        try:
+            attended = int(record.get('attended', 0))
+            total = int(record.get('total', 0))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if record.get('subjectName') and total > 0:
+            usable.append({**record, 'attended': attended, 'total': total})
+    return usable
+
+def _subject_code(record: Dict[str, Any]) -> str:
+    return record['subjectName'].split(' ')[0].split('/')[0].strip().upper()
+
+def _class_type(record: Dict[str, Any]) -> str:
+    class_type = str(record.get('classType') or '').strip().upper()
+    if class_type.startswith(('PRAC', 'LAB')):
+        return 'PRACTICAL'
+    if class_type.startswith(('THEO', 'LEC')):
+        return 'THEORY'
+    return class_type
+
+def _class_type_label(class_type: str) -> str:
+    return (_CLASS_TYPE_LABELS.get(class_type) or class_type.lower() or 'classes').capitalize()
+
+def _mentioned_class_type(message: str) -> Optional[str]:
+    """THEORY or PRACTICAL when the message asks about exactly one of them"""
+    mentioned = [class_type for class_type, pattern in _CLASS_TYPE_PATTERNS if pattern.search(message)]
+    return mentioned[0] if len(mentioned) == 1 else None
+
+def _parse_target(message: str) -> float:
+    matches = list(_TARGET_PATTERN.finditer(message))
+    # The last target phrase wins ("not 75%, I need to stay above 80%")
+    return float(matches[-1].group(1)) if matches else DEFAULT_TARGET
+
+def _mentioned_subject(message: str, records: List[Dict[str, Any]]) -> Optional[str]:
+    """Course code in the message that the student has records for"""
+    codes = {_subject_code(record) for record in records}
+    for match in _SUBJECT_PATTERN.finditer(message):
+        code = f"{match.group(1)}{match.group(2)}".upper()
+        if code in codes:
+            return code
+    return None
+
+def _breakdown(records: List[Dict[str, Any]], target: float = DEFAULT_TARGET, below_only: bool = False) -> str:
+    lines = []
+    for record in sorted(records, key=lambda r: (_subject_code(r), r.get('classType', ''))):
+        percentage = record['attended'] / record['total'] * 100
+        if below_only and percentage >= target:
+            continue
+        lines.append(f"\n- {_subject_code(record)} ({record.get('classType', '')}): "
+                     f"{record['attended']}/{record['total']} ({_format_percentage(percentage)}%)")
+    if not lines:
+        return ""
+    heading = f"\n\nBelow {target:g}%:" if below_only else "\n\nBy subject:"
+    return heading + "".join(lines)
+
+def _by_class_type(records: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """Attended and total classes of each class type"""
+    totals: Dict[str, List[int]] = {}
+    for record in records:
+        counts = totals.setdefault(_class_type(record), [0, 0])
+        counts[0] += record['attended']
+        counts[1] += record['total']
+    return totals
+
+def answer_locally(message: str, attendance_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    """
+    Answer a formulaic attendance question from the student's latest record
+
+    Handles: classes you can miss, percentage after missing N classes,
+    consecutive classes needed to reach a target, current percentage, total
+    classes conducted, and stats for one subject. Everything else is left to
+    Gemini.
+
+    Args:
+        message: The user's chat message
+        attendance_data: Latest stored attendance document for the student
+
+    Returns:
+        dict: intent and response, or None if the question needs Gemini
+    """
+    records = _records_from(attendance_data)
+    if not records:
+        return None
+
+    intent = None
+    match = None
+    for name, pattern in _INTENT_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            intent = name
+            break
+
+    subject = _mentioned_subject(message, records)
+    if intent is None:
+        if subject is None or not _SUBJECT_QUESTION_PATTERN.search(message):
+            return None
+        intent = 'subject_stats'
+
+    class_type = _mentioned_class_type(message)
+    selected = [record for record in records
+                if (subject is None or _subject_code(record) == subject)
+                and (class_type is None or _class_type(record) == class_type)]
+    if not selected:
+        return None
+    attended = sum(record['attended'] for record in selected)
+    total = sum(record['total'] for record in selected)
+    percentage = attended / total * 100
+    label = _CLASS_TYPE_LABELS.get(class_type)
+    scope = " ".join(part for part in ("in", subject, label) if part) if subject or label else "overall"
+
+    target = _parse_target(message)
+    if not 0 < target <= 100:
+        return None
+    target_text = f"{target:g}"
+
+    fields = {
+        'attended': attended,
+        'total': total,
+        'percentage': _format_percentage(percentage),
+        'scope': scope,
+        'target': target_text,
+        'subject': subject,
+    }
+
+    if intent == 'can_miss':
+        count = max(0, math.floor(attended * 100 / target - total + 1e-9))
+        response = _render(intent, _tier(percentage, target), count=count, **fields)
+    elif intent == 'after_missing':
+        count = int(match.group('count'))
+        new_total = total + count
+        new_percentage = attended / new_total * 100
+        if new_percentage >= target:
+            verdict = f"Still at or above {target_text}%, you'll live."
+        else:
+            verdict = f"That's below {target_text}%. Maybe don't 🙃"
+        response = _render(intent, _tier(percentage, target), count=count, new_total=new_total,
+                           new_percentage=_format_percentage(new_percentage), verdict=verdict, **fields)
+    elif intent == 'classes_needed':
+        if percentage >= target:
+            count = 0
+            tier = 'good'
+        elif target >= 100:
+            return None
+        else:
+            count = math.ceil((target * total / 100 - attended) / (1 - target / 100) - 1e-9)
+            tier = 'borderline' if percentage >= target - CLOSE_MARGIN else 'poor'
+        response = _render(intent, tier, count=count, **fields)
+    elif intent == 'current_percentage' and subject is None:
+        response = _render(intent, _tier(percentage, target),
+                           breakdown=_breakdown(selected, target, below_only=True), **fields)
+    elif intent == 'total_classes':
+        response = _render(intent, 'any', breakdown=_breakdown(selected, target), **fields)
+    else:
+        # Subject-specific question, or the current percentage of one subject. Each
+        # class type is reported on its own so a weak lab isn't hidden by lectures
+        by_type = _by_class_type(selected)
+        percentages = {kind: counts[0] / counts[1] * 100 for kind, counts in by_type.items()}
+        lines = "".join(f"\n- {_class_type_label(kind)}: {by_type[kind][0]}/{by_type[kind][1]} "
+                        f"({_format_percentage(percentages[kind])}%)" for kind in sorted(by_type))
+        below = " and ".join(_class_type_label(kind) for kind in sorted(by_type) if percentages[kind] < target)
+        response = _render('subject_stats', _tier(min(percentages.values()), target),
+                           by_type=lines, below=f"{below} are", **fields)
+        intent = 'subject_stats'
+
+    return {'intent': intent, 'response': response}
@@ -0,0 +1,162 @@
+import os
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from utils.cache import LRUCache
+from utils.gemini_client import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_shared_store = None
+
+def _clip(text: str, max_chars: int) -> str:
+    """Text on one line, cut to max_chars"""
+    text = ' '.join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 3].rstrip() + '...'
+
+class ChatSession:
+    """
+    Per-student chat state: the rendered attendance context and bounded history.
+
+    Recent turns are kept verbatim. Once they pass `history_token_budget`
+    (estimated), the oldest turns are folded into a rolling summary of short
+    one-line notes, and the summary itself is trimmed to about a quarter of
+    the budget, so the history part of the prompt stays within the budget
+    (only a single oversized latest turn can exceed it).
+    """
+
+    def __init__(self, student_id: str, history_token_budget: int = 1000):
+        self.student_id = student_id
+        self.history_token_budget = history_token_budget
+        # None until loaded; cleared when a new attendance record is saved.
+        # The generation goes up on every clear, so a load that started before
+        # a clear cannot store its stale result after it.
+        self.attendance_data = None
+        self.attendance_context = None
+        self.context_generation = 0
+        self.summary = ''
+        self.turns: List[Tuple[str, str]] = []
+        self.lock = threading.Lock()
+
+    def add_turn(self, message: str, response: str) -> None:
+        """Record a question and answer, compacting old turns if over budget"""
+        with self.lock:
+            self.turns.append((message, response))
+            self._compact()
+
+    def get_context(self) -> Tuple[int, Optional[Dict[str, Any]], Optional[str]]:
+        """The context generation, attendance document and rendered context (None if not loaded)"""
+        with self.lock:
+            return self.context_generation, self.attendance_data, self.attendance_context
+
+    def store_context(self, generation: int, attendance_data: Optional[Dict[str, Any]],
+                      attendance_context: str) -> bool:
+        """
+        Cache a loaded attendance context, unless it was cleared since `generation`
+
+        Returns:
+            bool: Whether the context was stored
+        """
+        with self.lock:
+            if generation != self.context_generation:
+                return False
+            self.attendance_data = attendance_data
+            self.attendance_context = attendance_context
+            return True
+
+    def invalidate_context(self) -> None:
+        """Drop the cached attendance context"""
+        with self.lock:
+            self.attendance_data = None
+            self.attendance_context = None
+            self.context_generation += 1
+
+    def render_history(self) -> str:
+        """History for the prompt: the rolling summary, then the recent turns"""
+        with self.lock:
+            parts = []
+            if self.summary:
+                parts.append(f"Earlier in this conversation: {self.summary}")
+            if self.turns:
+                parts.append("Recent conversation:")
+                for message, response in self.turns:
+                    parts.append(f"User: {message}")
+                    parts.append(f"Assistant: {response}")
+            return "\n".join(parts)
+
+    def _compact(self) -> None:
+        """Fold the oldest turns into the summary until the history fits (caller holds the lock)"""
+        def history_tokens():
+            return estimate_tokens(self.summary) + sum(
+                estimate_tokens(message) + estimate_tokens(response) for message, response in self.turns
+            )
+
+        # Always keep the latest turn verbatim
+        while len(self.turns) > 1 and history_tokens() > self.history_token_budget:
+            message, response = self.turns.pop(0)
+            note = f"User asked \"{_clip(message, 120)}\", you said \"{_clip(response, 160)}\"."
+            self.summary = f"{self.summary} {note}".strip()
+
+        # Drop the oldest notes once the summary itself gets long
+        max_summary_chars = self.history_token_budget  # about a quarter of the budget in tokens
+        if len(self.summary) > max_summary_chars:
+            self.summary = '...' + self.summary[-max_summary_chars:].split(' ', 1)[-1]
+
+class ChatSessionStore:
+    """In-process chat sessions keyed by student id, evicted after `ttl_seconds` idle"""
+
+    def __init__(self, ttl_seconds: float = 1800, max_sessions: int = 1000,
+                 history_token_budget: int = 1000):
+        self.history_token_budget = history_token_budget
+        self._sessions = LRUCache(max_entries=max_sessions, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self.context_hits = 0
+        self.context_misses = 0
+
+    def get(self, student_id: str) -> ChatSession:
+        """Get a student's session, creating it if needed, and push back its expiry"""
+        with self._lock:
+            session = self._sessions.get(student_id)
+            if session is None:
+                session = ChatSession(student_id, self.history_token_budget)
+            self._sessions.set(student_id, session)
+            return session
+
+    def invalidate_context(self, student_id: str) -> None:
+        """Forget a student's cached attendance context, e.g. after a new record is saved"""
+        with self._lock:
+            session = self._sessions.get(student_id)
+        if session is not None:
+            session.invalidate_context()
+
+    def record_context_lookup(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.context_hits += 1
+            else:
+                self.context_misses += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get session count and attendance context cache counters"""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'contextHits': self.context_hits,
+                'contextMisses': self.context_misses,
+                'historyTokenBudget': self.history_token_budget
+            }
+
+def get_chat_session_store() -> ChatSessionStore:
+    """Get the process-wide chat session store, building it on first use"""
+    global _shared_store
+
+    if _shared_store is None:
+        with _lock:
+            if _shared_store is None:
+                _shared_store = ChatSessionStore(
+                    ttl_seconds=float(os.environ.get('CHAT_SESSION_TTL', 30 * 60)),
+                    max_sessions=int(os.environ.get('CHAT_MAX_SESSIONS', 1000)),
+                    history_token_budget=int(os.environ.get('CHAT_HISTORY_TOKEN_BUDGET', 1000))
+                )
+    return _shared_store
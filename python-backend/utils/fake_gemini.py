@@ -0,0 +1,70 @@
+import os
+import random
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class FakeGeminiError(Exception):
+    """Simulated upstream failure"""
+
+class FakeGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+class FakeGeminiModel:
+    """
+    Local stand-in for `genai.GenerativeModel`, for running the backend and
+    exercising GeminiClient without an API key.
+
+    Answers every prompt with `response_text` after `latency_ms` (plus up to
+    `jitter_ms`), and fails with FakeGeminiError at `failure_rate`.
+    """
+
+    def __init__(self, model_name: str = 'fake-gemini', response_text: str = 'This is a reply from the fake Gemini model.',
+                 latency_ms: float = 0, jitter_ms: float = 0, failure_rate: float = 0,
+                 system_instruction: Optional[str] = None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.response_text = response_text
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls, model_name: str, system_instruction: Optional[str] = None) -> 'FakeGeminiModel':
+        """Build a fake model configured by GEMINI_FAKE_* environment variables"""
+        return cls(
+            model_name=f"fake/{model_name}",
+            response_text=os.environ.get('GEMINI_FAKE_RESPONSE', 'This is a reply from the fake Gemini model.'),
+            latency_ms=float(os.environ.get('GEMINI_FAKE_LATENCY_MS', 0)),
+            jitter_ms=float(os.environ.get('GEMINI_FAKE_JITTER_MS', 0)),
+            failure_rate=float(os.environ.get('GEMINI_FAKE_FAILURE_RATE', 0)),
+            system_instruction=system_instruction
+        )
+
+    def generate_content(self, prompt, **kwargs) -> FakeGeminiResponse:
+        self.calls += 1
+
+        if random.random() < self.failure_rate:
+            raise FakeGeminiError("Simulated Gemini failure")
+
+        delay = (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+        if kwargs.get('stream'):
+            return self._stream(self.response_text, delay)
+
+        if delay > 0:
+            time.sleep(delay)
+        return FakeGeminiResponse(self.response_text)
+
+    def _stream(self, text: str, delay: float):
+        """Yield the reply a few words at a time, spreading the latency over the chunks"""
+        words = text.split(' ')
+        chunks = [' '.join(words[i:i + 4]) for i in range(0, len(words), 4)]
+        for index, chunk in enumerate(chunks):
+            if delay > 0:
+                time.sleep(delay / len(chunks))
+            yield FakeGeminiResponse(chunk if index == len(chunks) - 1 else chunk + ' ')
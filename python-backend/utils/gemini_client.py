@@ -0,0 +1,339 @@
+import random
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Upstream errors that retrying will not fix; they don't count against the breaker
+NON_RETRYABLE_ERRORS = (
+    'InvalidArgument', 'PermissionDenied', 'Unauthenticated', 'NotFound',
+    'BlockedPromptException', 'StopCandidateException', 'ValueError', 'TypeError'
+)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for text, at about four characters per token"""
+    return (len(text) + 3) // 4
+
+def usage_tokens(response) -> Optional[Dict[str, int]]:
+    """Token counts reported by Gemini for a response, or None if it has none"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None
+    return {
+        'promptTokens': getattr(usage, 'prompt_token_count', None),
+        'responseTokens': getattr(usage, 'candidates_token_count', None),
+        'totalTokens': getattr(usage, 'total_token_count', None)
+    }
+
+class GeminiUnavailable(Exception):
+    """Raised when Gemini cannot answer in time or is marked unhealthy"""
+
+class GeminiTimeout(GeminiUnavailable):
+    """Raised when a call does not finish before its deadline"""
+
+class CircuitOpenError(GeminiUnavailable):
+    """Raised without calling Gemini while the circuit breaker is open"""
+
+class GeminiClient:
+    """
+    Wrapper around a Gemini model that never blocks a caller past a deadline.
+
+    Calls run on a small thread pool; the caller waits for at most the deadline
+    and then gets a GeminiTimeout (the upstream call is left to finish in the
+    background). Failed calls are retried with full-jitter exponential backoff
+    while the retry budget allows it: every call deposits `retry_budget` tokens
+    and every retry or hedge spends one, so retries stay a bounded share of
+    traffic during an outage. When `hedge_percentile` is set, a second identical
+    request is sent once a call runs longer than that latency percentile, and
+    the first answer wins. After `breaker_failures` consecutive failed calls the
+    circuit opens and calls fail fast with CircuitOpenError for
+    `breaker_reset_seconds`, after which a single probe call is let through.
+
+    Exposes `generate_content` and `model_name`, so it can stand in for a
+    `genai.GenerativeModel`.
+    """
+
+    def __init__(self, model, deadline_seconds: float = 20, max_retries: int = 2,
+                 retry_budget: float = 0.2, backoff_ms: float = 200, max_backoff_ms: float = 2000,
+                 hedge_percentile: float = 0, hedge_min_samples: int = 20,
+                 breaker_failures: int = 5, breaker_reset_seconds: float = 30,
+                 max_workers: int = 16, name: Optional[str] = None):
+        self.model = model
+        # The registry name also tells apart models built with different system instructions
+        self.model_name = name or getattr(model, 'model_name', '')
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max(0, max_retries)
+        self.retry_budget = retry_budget
+        self.backoff_seconds = backoff_ms / 1000
+        self.max_backoff_seconds = max_backoff_ms / 1000
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker_failures = max(1, breaker_failures)
+        self.breaker_reset_seconds = breaker_reset_seconds
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                            thread_name_prefix='gemini-client')
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=200)
+        self._budget_tokens = 10.0
+        self._max_budget_tokens = 10.0
+
+        self._state = 'closed'
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        self._calls = 0
+        self._failures = 0
+        self._timeouts = 0
+        self._retries = 0
+        self._hedges = 0
+        self._short_circuited = 0
+
+    def generate_content(self, prompt, deadline: Optional[float] = None, **kwargs):
+        """
+        Call the model's generate_content under a deadline, with retries and hedging
+
+        Args:
+            prompt: Prompt passed to the model
+            deadline: Seconds the caller is willing to wait (default deadline_seconds)
+            **kwargs: Passed through to the model's generate_content
+
+        Returns:
+            The model's response
+
+        Raises:
+            CircuitOpenError: The breaker is open, Gemini was not called
+            GeminiTimeout: No answer before the deadline
+            GeminiUnavailable: Retryable failures used up the retries or budget
+        """
+        self._before_call()
+        deadline_at = time.monotonic() + (deadline if deadline is not None else self.deadline_seconds)
+
+        with self._lock:
+            self._calls += 1
+            self._budget_tokens = min(self._max_budget_tokens, self._budget_tokens + self.retry_budget)
+
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = self._attempt(prompt, kwargs, deadline_at)
+                except Exception as e:
+                    retryable = self._is_retryable(e)
+                    remaining = deadline_at - time.monotonic()
+                    backoff = random.uniform(0, min(self.max_backoff_seconds,
+                                                    self.backoff_seconds * (2 ** attempt)))
+
+                    if (not retryable or isinstance(e, GeminiTimeout) or attempt >= self.max_retries
+                            or backoff >= remaining or not self._spend_budget()):
+                        if retryable:
+                            self._record_failure()
+                        else:
+                            self._release_probe()
+                        if retryable and not isinstance(e, GeminiUnavailable):
+                            raise GeminiUnavailable(f"Gemini call failed: {str(e)}") from e
+                        raise
+
+                    attempt += 1
+                    with self._lock:
+                        self._retries += 1
+                    logger.warning(f"Gemini call failed ({str(e)}), retry {attempt} in {backoff * 1000:.0f}ms")
+                    time.sleep(backoff)
+                    continue
+
+                self._record_success()
+                return response
+        except BaseException:
+            self._release_probe()
+            raise
+
+    def stream_content(self, prompt, deadline: Optional[float] = None, **kwargs) -> Iterator[str]:
+        """
+        Stream the response text chunk by chunk, all within one deadline
+
+        Opening the stream goes through generate_content (retries and breaker
+        apply); each later chunk is read on the thread pool so a stalled stream
+        still ends at the deadline.
+
+        Args:
+            prompt: Prompt passed to the model
+            deadline: Seconds the whole stream may take (default deadline_seconds)
+            **kwargs: Passed through to the model's generate_content
+
+        Yields:
+            str: Text of each chunk as it arrives
+
+        Raises:
+            GeminiUnavailable: The stream could not be opened or stalled past the deadline
+        """
+        deadline_at = time.monotonic() + (deadline if deadline is not None else self.deadline_seconds)
+        response = self.generate_content(prompt, deadline=deadline_at - time.monotonic(),
+                                         stream=True, **kwargs)
+        chunks = iter(response)
+        end = object()
+
+        while True:
+            remaining = deadline_at - time.monotonic()
+            future = self._executor.submit(next, chunks, end)
+            try:
+                if remaining <= 0:
+                    raise GeminiTimeout("Gemini stream did not finish within the deadline")
+                done, _ = wait([future], timeout=remaining)
+                if not done:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise GeminiTimeout("Gemini stream did not finish within the deadline")
+                chunk = future.result()
+            except GeminiUnavailable:
+                self._record_failure()
+                raise
+            except Exception as e:
+                self._record_failure()
+                raise GeminiUnavailable(f"Gemini stream failed: {str(e)}") from e
+
+            if chunk is end:
+                return
+            text = getattr(chunk, 'text', '')
+            if text:
+                yield text
+
+    def _attempt(self, prompt, kwargs, deadline_at):
+        """One attempt, plus an optional hedged duplicate, bounded by the deadline"""
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise GeminiTimeout("Gemini deadline exceeded")
+
+        # Let the HTTP layer give up at the same time as the caller
+        kwargs = dict(kwargs)
+        kwargs.setdefault('request_options', {'timeout': remaining})
+
+        start = time.monotonic()
+        # A hedged stream would be read twice, so streams are never hedged
+        hedge_delay = None if kwargs.get('stream') else self._hedge_delay()
+        futures = {self._executor.submit(self.model.generate_content, prompt, **kwargs)}
+        error = None
+
+        while True:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                with self._lock:
+                    self._timeouts += 1
+                raise GeminiTimeout("Gemini did not answer within the deadline")
+
+            timeout = remaining
+            if hedge_delay is not None:
+                timeout = min(remaining, max(0.0, start + hedge_delay - time.monotonic()))
+
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.discard(future)
+                if future.exception() is None:
+                    with self._lock:
+                        self._latencies.append(time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+
+            if not futures:
+                raise error
+
+            if hedge_delay is not None and time.monotonic() - start >= hedge_delay:
+                # Only one hedge per attempt, and only if the budget allows it
+                if self._spend_budget():
+                    with self._lock:
+                        self._hedges += 1
+                    logger.info(f"Hedging Gemini call after {hedge_delay * 1000:.0f}ms")
+                    futures.add(self._executor.submit(self.model.generate_content, prompt, **kwargs))
+                hedge_delay = None
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Latency percentile after which to hedge, or None if hedging is off"""
+        if self.hedge_percentile <= 0:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100))
+        return latencies[index]
+
+    def _is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, CircuitOpenError):
+            return False
+        return not any(cls.__name__ in NON_RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+    def _spend_budget(self) -> bool:
+        """Take one token for a retry or hedge, if there is one"""
+        with self._lock:
+            if self._budget_tokens < 1:
+                return False
+            self._budget_tokens -= 1
+            return True
+
+    def _before_call(self) -> None:
+        """Fail fast while the breaker is open; let one probe through after the reset time"""
+        with self._lock:
+            if self._state == 'closed':
+                return
+
+            if self._state == 'open' and time.monotonic() - self._opened_at >= self.breaker_reset_seconds:
+                self._state = 'half_open'
+
+            if self._state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+
+            self._short_circuited += 1
+        raise CircuitOpenError("Gemini is unavailable, circuit breaker is open")
+
+    def _record_success(self) -> None:
+        with self._lock:
+            if self._state != 'closed':
+                logger.info("Gemini circuit breaker closed")
+            self._state = 'closed'
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def _record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._consecutive_failures += 1
+            if self._state == 'half_open' or (
+                self._state == 'closed' and self._consecutive_failures >= self.breaker_failures
+            ):
+                logger.warning(f"Gemini circuit breaker opened after {self._consecutive_failures} failures")
+                self._state = 'open'
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def _release_probe(self) -> None:
+        with self._lock:
+            self._probe_in_flight = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get breaker state, latency percentiles and retry counters"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def percentile(p):
+                if not latencies:
+                    return None
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000, 1)
+
+            return {
+                'model': self.model_name,
+                'breaker': self._state,
+                'calls': self._calls,
+                'failures': self._failures,
+                'timeouts': self._timeouts,
+                'retries': self._retries,
+                'hedges': self._hedges,
+                'shortCircuited': self._short_circuited,
+                'retryBudget': round(self._budget_tokens, 2),
+                'p50Ms': percentile(50),
+                'p95Ms': percentile(95)
+            }
@@ -1,38 +1,132 @@
-import google.generativeai as genai
 import os
 import json
 import logging
 import re
-from typing import Dict, Any
-from utils.ocr_processor import OCRProcessor
+import threading
+from typing import Dict, Any, Callable, Hashable, List, Optional, Tuple
+from utils.attendance_parser import parse_attendance_text
+from utils import model_registry
+from utils.llm_cache import get_llm_cache
+from utils.gemini_client import GeminiUnavailable
+from utils.json_stream import RecordStreamParser
+from utils.micro_batcher import MicroBatcher
 
 logger = logging.getLogger(__name__)
 
+# 'schema' asks for schema-constrained JSON and parses it as it streams,
+# 'text' uses the original free-form prompt
+EXTRACTION_MODES = ('schema', 'text')
+
+# Response schema for structured extraction, in the OpenAPI subset Gemini accepts
+ATTENDANCE_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'student_id': {'type': 'STRING'},
+        'records': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'subjectName': {'type': 'STRING'},
+                    'classType': {'type': 'STRING', 'enum': ['THEORY', 'PRACTICAL']},
+                    'attended': {'type': 'INTEGER'},
+                    'total': {'type': 'INTEGER'},
+                    'percentage': {'type': 'NUMBER'}
+                },
+                'required': ['subjectName', 'classType', 'attended', 'total', 'percentage']
+            }
+        },
+        'overallPercentage': {'type': 'NUMBER'}
+    },
+    'required': ['student_id', 'records', 'overallPercentage']
+}
+
+STRUCTURED_GENERATION_CONFIG = {
+    'response_mime_type': 'application/json',
+    'response_schema': ATTENDANCE_SCHEMA
+}
+
+# Several OCR texts extracted in one prompt, each answer tagged with its document id
+BATCH_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'documents': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {'id': {'type': 'STRING'}, **ATTENDANCE_SCHEMA['properties']},
+                'required': ['id', 'student_id', 'records', 'overallPercentage']
+            }
+        }
+    },
+    'required': ['documents']
+}
+
+BATCH_GENERATION_CONFIG = {
+    'response_mime_type': 'application/json',
+    'response_schema': BATCH_SCHEMA
+}
+
 class GeminiProcessor:
-    def __init__(self):
-        # Get API key from environment variable
-        api_key = os.environ.get("GEMINI_API_KEY")
-        if not api_key:
-            logger.warning("GEMINI_API_KEY environment variable is not set, using fallback parsing only")
-        else:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash')
+    def __init__(self, extraction_mode: Optional[str] = None, batch_window_ms: float = 0,
+                 max_batch_size: int = 8, batch_workers: int = 16):
+        # Shared Gemini client, None when GEMINI_API_KEY is not set
+        self.model = model_registry.get_gemini_model()
+        self.llm_cache = get_llm_cache()
+        if self.model is None:
+            logger.warning("Gemini is not configured, using fallback parsing only")
 
-        # Initialize OCR processor for fallback parsing
-        self.ocr_processor = OCRProcessor()
+        self.extraction_mode = extraction_mode or os.environ.get('GEMINI_EXTRACTION_MODE', 'schema')
+        if self.extraction_mode not in EXTRACTION_MODES:
+            raise ValueError(f"Unsupported Gemini extraction mode: {self.extraction_mode}")
 
-    def process_text(self, text: str) -> Dict[str, Any]:
+        # Cross-request batching of extraction prompts (disabled when the window is 0).
+        # Batches run in parallel on up to batch_workers threads, and a text with
+        # no company in its window is extracted on its own request thread.
+        self.batcher = None
+        if batch_window_ms > 0 and max_batch_size > 1:
+            logger.info(f"Batching Gemini extraction over {batch_window_ms}ms windows")
+            self.batcher = MicroBatcher(self._process_batch, window_ms=batch_window_ms,
+                                        max_batch_size=max_batch_size, name='gemini-batcher',
+                                        max_workers=batch_workers)
+        self._stats_lock = threading.Lock()
+        self.batch_calls = 0
+        self.batched_documents = 0
+        self.cached_documents = 0
+        self.document_fallbacks = 0
+
+    def process_text(self, text: str,
+                     on_record: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
         """
         Process the OCR text using Gemini to extract structured attendance data.
         Falls back to OCR processor if Gemini is not available or fails.
+
+        Args:
+            text: The OCR extracted text
+            on_record: Optional callback given each validated record as soon as
+                       it is parsed (schema mode streams records one by one)
         """
         # Check if Gemini model is available
-        if not hasattr(self, 'model'):
+        if self.model is None:
             logger.info("Gemini model not available, using OCR processor directly")
             return self._fallback_parsing(text)
 
-        try:
-            prompt = f"""
+        # Streaming callers need their own response; everyone else can share a prompt
+        if self.batcher is not None and on_record is None:
+            return self.batcher.submit(text)
+
+        return self._process_single(text, on_record)
+
+    def _process_single(self, text: str,
+                        on_record: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Extract one OCR text with its own Gemini call"""
+        if self.extraction_mode == 'schema':
+            return self._process_structured(text, on_record)
+        return self._process_freeform(text)
+
+    def _freeform_prompt(self, text: str) -> str:
+        """Single-document prompt for the free-form ('text') extraction mode"""
+        return f"""
             Extract attendance information from the following text and convert it to JSON format.
             The output should follow this exact structure:
             {{
@@ -62,12 +156,40 @@ class GeminiProcessor:
             Return only valid JSON, no additional text or explanations. Do not include any markdown formatting.
             """
 
-            response = self.model.generate_content(prompt)
+    def _structured_prompt(self, text: str) -> str:
+        """Single-document prompt for schema-constrained extraction"""
+        return f"""
+            Extract attendance information from the following text.
+
+            Rules:
+            1. For subject names, use the course code (e.g., "IT101", "HS121")
+            2. Class type should be either "THEORY" for lectures or "PRACTICAL" for labs
+            3. Calculate percentage as (attended/total * 100) rounded to 2 decimal places
+            4. Overall percentage is the sum of all attended classes divided by the sum of all total classes
+            5. Extract student ID if present, otherwise use "unknown"
+
+            Text to process:
+            {text}
+            """
+
+    def _single_request(self, text: str) -> Tuple[str, Dict[str, Any]]:
+        """Prompt and generation options a text is sent with when extracted alone"""
+        if self.extraction_mode == 'schema':
+            return self._structured_prompt(text), {'generation_config': STRUCTURED_GENERATION_CONFIG}
+        return self._freeform_prompt(text), {}
+
+    def _process_freeform(self, text: str) -> Dict[str, Any]:
+        """Extract attendance with the original free-form prompt and JSON clean-up"""
+        try:
+            prompt = self._freeform_prompt(text)
+
+            # Identical OCR text gets the cached answer
+            response_text = self.llm_cache.generate(self.model, prompt)
 
             # Extract JSON from the response
             try:
                 # Clean the response text to ensure it's valid JSON
-                json_str = response.text.strip()
+                json_str = response_text.strip()
 
                 # Handle markdown code blocks
                 if '```' in json_str:
@@ -96,15 +218,250 @@ class GeminiProcessor:
 
             except json.JSONDecodeError as e:
                 logger.error(f"Failed to parse Gemini response as JSON: {e}")
-                logger.error(f"Raw response: {response.text}")
+                logger.error(f"Raw response: {response_text}")
                 # Fall back to parsing the text directly
                 return self._fallback_parsing(text)
 
+        except GeminiUnavailable as e:
+            # Timed out or circuit open: answer from the local parser right away
+            logger.warning(f"Gemini unavailable, using fallback parsing: {str(e)}")
+            return self._fallback_parsing(text)
+
         except Exception as e:
             logger.error(f"Error processing text with Gemini: {str(e)}")
             # Fall back to parsing the text directly
             return self._fallback_parsing(text)
 
+    def _process_structured(self, text: str,
+                            on_record: Optional[Callable[[Dict[str, Any]], None]]) -> Dict[str, Any]:
+        """
+        Extract attendance with schema-constrained JSON, parsing the stream as it arrives
+
+        Each record is validated and passed to on_record once its closing brace
+        arrives. If the stream breaks off after some records, those records are
+        kept, the subjects they miss are filled in from the local parse, and the
+        result is marked `partial` so callers don't cache or save it. The OCR
+        text is only re-parsed alone if no record arrived.
+        """
+        prompt = self._structured_prompt(text)
+
+        parser = RecordStreamParser('records')
+        records = []
+        stream_failed = False
+        try:
+            for chunk in self.llm_cache.stream(self.model, prompt,
+                                               generation_config=STRUCTURED_GENERATION_CONFIG):
+                for record in parser.feed(chunk):
+                    record = self._normalize_record(record)
+                    if record is None:
+                        continue
+                    records.append(record)
+                    if on_record is not None:
+                        try:
+                            on_record(record)
+                        except Exception as e:
+                            logger.error(f"Record callback failed: {str(e)}")
+        except GeminiUnavailable as e:
+            stream_failed = True
+            logger.warning(f"Gemini unavailable after {len(records)} streamed records: {str(e)}")
+        except Exception as e:
+            stream_failed = True
+            logger.error(f"Error streaming structured extraction from Gemini: {str(e)}")
+
+        if not records:
+            # Fall back to parsing the text directly
+            return self._fallback_parsing(text)
+
+        if stream_failed:
+            # Keep what Gemini sent and add the subjects it never got to
+            seen = {(record['subjectName'], record['classType']) for record in records}
+            local_records = [
+                record for record in self._fallback_parsing(text)['records']
+                if (record['subjectName'], record['classType']) not in seen
+            ]
+            logger.warning(f"Partial extraction: {len(records)} streamed records, "
+                           f"{len(local_records)} added from the local parse")
+            result = self._build_result(None, records + local_records)
+            result['partial'] = True
+            return result
+
+        document = parser.result() or {}
+        logger.info(f"Successfully parsed attendance data with Gemini: {len(records)} subjects found")
+        return self._build_result(document.get('student_id'), records)
+
+    def _process_batch(self, group_key: Hashable, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Extract several OCR texts, sharing one multi-document prompt where needed
+
+        A text whose single-document prompt is already in the response cache is
+        answered from it, as it would be without batching. Only the rest are
+        sent together; a lone miss is extracted on its own.
+        """
+        if len(texts) == 1:
+            return [self._process_single(texts[0])]
+
+        results = [self._cached_result(text) for text in texts]
+        misses = [index for index, result in enumerate(results) if result is None]
+        with self._stats_lock:
+            self.cached_documents += len(texts) - len(misses)
+
+        if len(misses) == 1:
+            results[misses[0]] = self._process_single(texts[misses[0]])
+        elif misses:
+            batch = self._extract_batch([texts[index] for index in misses])
+            for index, result in zip(misses, batch):
+                results[index] = result
+        return results
+
+    def _cached_result(self, text: str) -> Optional[Dict[str, Any]]:
+        """Result for a text from the cached answer to its single-document prompt, if any"""
+        prompt, kwargs = self._single_request(text)
+        response_text = self.llm_cache.lookup(self.model, prompt, **kwargs)
+        if response_text is None:
+            return None
+        try:
+            document = json.loads(self._extract_json(response_text.strip()) or 'null')
+            records = [record for record in map(self._normalize_record, document.get('records') or [])
+                       if record is not None]
+        except Exception as e:
+            logger.warning(f"Ignoring unusable cached Gemini response: {str(e)}")
+            return None
+        if not records:
+            return None
+        return self._build_result(document.get('student_id'), records)
+
+    def _extract_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Extract several OCR texts with one multi-document prompt
+
+        Each text is sent as a document with an id, and each answer is matched
+        back to its document by that id. A document that is missing from the
+        answer, or has no valid record, falls back to local parsing on its own;
+        if the whole call fails, every document does. Each usable answer is
+        cached under the document's single-document prompt.
+        """
+        ids = [f"doc-{index + 1}" for index in range(len(texts))]
+        documents = "\n".join(
+            f'<document id="{doc_id}">\n{text}\n</document>' for doc_id, text in zip(ids, texts)
+        )
+        prompt = f"""
+            Extract attendance information from each of the documents below. Each document
+            is the OCR text of one student's attendance screenshot. Return one entry in
+            "documents" per document, with the document's id, and never move records from
+            one document to another.
+
+            Rules:
+            1. For subject names, use the course code (e.g., "IT101", "HS121")
+            2. Class type should be either "THEORY" for lectures or "PRACTICAL" for labs
+            3. Calculate percentage as (attended/total * 100) rounded to 2 decimal places
+            4. Overall percentage is the sum of all attended classes divided by the sum of all total classes
+            5. Extract student ID if present, otherwise use "unknown"
+
+            Documents:
+            {documents}
+            """
+
+        kwargs = {}
+        if self.extraction_mode == 'schema':
+            kwargs['generation_config'] = BATCH_GENERATION_CONFIG
+        else:
+            prompt += """
+            Return only valid JSON of the form {"documents": [{"id": "string", "student_id": "string",
+            "records": [{"subjectName": "string", "classType": "THEORY or PRACTICAL", "attended": number,
+            "total": number, "percentage": number}], "overallPercentage": number}]}, with no additional
+            text, explanations or markdown formatting.
+            """
+
+        answers = {}
+        try:
+            # A batch prompt practically never repeats; its answers are cached per document below
+            response_text = self.llm_cache.generate(self.model, prompt, use_cache=False, **kwargs)
+            json_str = response_text.strip()
+            match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', json_str)
+            if match:
+                json_str = match.group(1).strip()
+            parsed = json.loads(self._extract_json(json_str) or 'null')
+            for answer in (parsed or {}).get('documents') or []:
+                if isinstance(answer, dict) and answer.get('id') in ids:
+                    answers.setdefault(answer['id'], answer)
+        except GeminiUnavailable as e:
+            logger.warning(f"Gemini unavailable for a batch of {len(texts)} documents: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error processing a batch of {len(texts)} documents with Gemini: {str(e)}")
+
+        results = []
+        fallbacks = 0
+        for doc_id, text in zip(ids, texts):
+            answer = answers.get(doc_id) or {}
+            records = answer.get('records') if isinstance(answer.get('records'), list) else []
+            records = [record for record in map(self._normalize_record, records) if record is not None]
+            if records:
+                result = self._build_result(answer.get('student_id'), records)
+                prompt, kwargs = self._single_request(text)
+                self.llm_cache.store(self.model, prompt, json.dumps(result), **kwargs)
+                results.append(result)
+            else:
+                logger.warning(f"No usable records for batched document {doc_id}")
+                fallbacks += 1
+                results.append(self._fallback_parsing(text))
+
+        with self._stats_lock:
+            self.batch_calls += 1
+            self.batched_documents += len(texts)
+            self.document_fallbacks += fallbacks
+
+        logger.info(f"Extracted a batch of {len(texts)} documents with Gemini ({fallbacks} parsed locally)")
+        return results
+
+    def _build_result(self, student_id: Any, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Attendance data from validated records, with the overall percentage recomputed"""
+        total_attended = sum(record['attended'] for record in records)
+        total_classes = sum(record['total'] for record in records)
+        return {
+            'student_id': str(student_id or 'unknown'),
+            'records': records,
+            'overallPercentage': round(total_attended / total_classes * 100, 2) if total_classes > 0 else 0
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get multi-document batching counters"""
+        with self._stats_lock:
+            return {
+                'batching': self.batcher is not None,
+                'batchCalls': self.batch_calls,
+                'batchedDocuments': self.batched_documents,
+                'cachedDocuments': self.cached_documents,
+                'documentFallbacks': self.document_fallbacks
+            }
+
+    def _normalize_record(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Validate one extracted record and recompute its percentage
+
+        Returns:
+            dict: The cleaned record, or None if it is unusable
+        """
+        try:
+            subject_name = str(record['subjectName']).strip()
+            class_type = str(record['classType']).upper()
+            attended = int(record['attended'])
+            total = int(record['total'])
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f"Dropping malformed record: {record}")
+            return None
+
+        if not subject_name or class_type not in ('THEORY', 'PRACTICAL') or total <= 0 or not 0 <= attended <= total:
+            logger.warning(f"Dropping invalid record: {record}")
+            return None
+
+        return {
+            'subjectName': subject_name,
+            'classType': class_type,
+            'attended': attended,
+            'total': total,
+            'percentage': round(attended / total * 100, 2)
+        }
+
     def _extract_json(self, text: str) -> str:
         """
         Try to extract JSON from text that might contain other content
@@ -135,59 +492,10 @@ class GeminiProcessor:
         when Gemini fails to return valid JSON
         """
         logger.info("Using fallback parsing for attendance data")
-        
-        # Example pattern for subject code
-        subject_pattern = r'((?:HS|IT|MA|CSE|EC|DS|WT)\d+(?:\.\d+)?)'
-        attendance_pattern = r'(\d+)\s*\/\s*(\d+)'
-        
-        lines = text.split('\n')
-        if not lines:
-            lines = text.split(' ')
-        
-        records = []
-        total_attended = 0
-        total_classes = 0
-        
-        for line in lines:
-            # Look for subject codes
-            subject_match = re.search(subject_pattern, line)
-            if subject_match:
-                subject_name = subject_match.group(1).strip()
-                
-                # Determine class type
-                class_type = "THEORY"
-                if "LAB" in line or "PRACTICAL" in line:
-                    class_type = "PRACTICAL"
-                
-                # Look for attendance numbers (X/Y format)
-                attendance_match = re.search(attendance_pattern, line)
-                if attendance_match:
-                    attended = int(attendance_match.group(1))
-                    total = int(attendance_match.group(2))
-                    
-                    # Calculate percentage
-                    percentage = round((attended / total) * 100, 2) if total > 0 else 0
-                    
-                    records.append({
-                        "subjectName": subject_name,
-                        "classType": class_type,
-                        "attended": attended,
-                        "total": total,
-                        "percentage": percentage
-                    })
-                    
-                    total_attended += attended
-                    total_classes += total
-        
-        # Calculate overall percentage
-        overall_percentage = round((total_attended / total_classes) * 100, 2) if total_classes > 0 else 0
-        
-        return {
-            "student_id": "unknown",  # Placeholder, would be determined by user authentication
-            "records": records,
-            "overallPercentage": overall_percentage
-        }
-            
+
+        # student_id is a placeholder, would be determined by user authentication
+        return parse_attendance_text(text, student_id="unknown", codes_only=True)
+
     def _validate_json_structure(self, data: Dict[str, Any]) -> None:
         """
         Validate the JSON structure matches our expected format
@@ -0,0 +1,56 @@
+import io
+import logging
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured byte or pixel limits"""
+
+def read_upload(stream, max_bytes: int) -> bytes:
+    """
+    Read an uploaded file into memory, refusing anything larger than max_bytes
+
+    Args:
+        stream: File-like object of the upload
+        max_bytes: Maximum accepted size in bytes
+
+    Returns:
+        bytes: Raw upload contents
+    """
+    data = stream.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ImageTooLargeError(f"Upload exceeds the maximum size of {max_bytes} bytes")
+    return data
+
+def decode_grayscale(image_bytes: bytes, max_pixels: int) -> np.ndarray:
+    """
+    Decode image bytes straight into a grayscale numpy array
+
+    The pixel count is checked from the image header before any pixel data is
+    decoded. JPEGs are decoded in luma-only draft mode, other formats are
+    converted to grayscale by PIL during decoding, so no RGB buffer, temporary
+    file or PNG re-encode is needed.
+
+    Args:
+        image_bytes: Encoded image (PNG, JPEG, ...)
+        max_pixels: Maximum accepted width * height
+
+    Returns:
+        np.ndarray: 2D uint8 grayscale image
+    """
+    image = Image.open(io.BytesIO(image_bytes))  # Only parses the header
+
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is {width}x{height}, which exceeds the maximum of {max_pixels} pixels"
+        )
+
+    if image.format == 'JPEG':
+        image.draft('L', image.size)
+
+    gray = image if image.mode == 'L' else image.convert('L')
+    logger.info(f"Decoded {image.format} upload of {width}x{height} to grayscale")
+    return np.asarray(gray)
@@ -0,0 +1,98 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class RecordStreamParser:
+    """
+    Incremental parser for a streamed JSON object holding an array of records.
+
+    Text is fed in chunks as it arrives. The parser tracks string, escape and
+    nesting state across chunks, and returns each element of the top-level
+    `array_key` array as soon as its closing brace arrives, without waiting for
+    the rest of the document. `result()` parses the whole document at the end.
+    """
+
+    def __init__(self, array_key: str = 'records'):
+        self.array_key = array_key
+        self._text = ''
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._current_key = None
+        self._item_start = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Add a chunk of streamed text
+
+        Returns:
+            list: Records completed by this chunk, in order
+        """
+        self._text += chunk
+        completed = []
+        text = self._text
+
+        for i in range(self._pos, len(text)):
+            char = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:i]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char == ':':
+                if self._stack and self._stack[-1][0] == '{':
+                    self._current_key = self._last_string
+            elif char in '{[':
+                key = self._current_key if self._stack and self._stack[-1][0] == '{' else None
+                if char == '{' and self._in_records_array():
+                    self._item_start = i
+                self._stack.append((char, key))
+                self._current_key = None
+            elif char in '}]':
+                if not self._stack:
+                    continue
+                opener, _ = self._stack.pop()
+                if opener == '{' and self._item_start is not None and self._in_records_array():
+                    item = self._parse_item(text[self._item_start:i + 1])
+                    if item is not None:
+                        completed.append(item)
+                    self._item_start = None
+            elif char == ',':
+                self._current_key = None
+
+        self._pos = len(text)
+        return completed
+
+    def _in_records_array(self) -> bool:
+        """Whether the innermost open container is the top-level records array"""
+        return len(self._stack) == 2 and self._stack[-1] == ('[', self.array_key)
+
+    def _parse_item(self, text: str) -> Optional[Dict[str, Any]]:
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Skipping malformed streamed record: {str(e)}")
+            return None
+        return item if isinstance(item, dict) else None
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Parse the whole document, or None if it is not a complete JSON object"""
+        try:
+            document = json.loads(self._text)
+        except json.JSONDecodeError:
+            return None
+        return document if isinstance(document, dict) else None
@@ -0,0 +1,144 @@
+import os
+import re
+import json
+import threading
+import logging
+from typing import Any, Dict, Iterator, Optional, Tuple
+from utils.cache import LRUCache, TieredCache, content_key
+from utils.gemini_client import usage_tokens
+
+logger = logging.getLogger(__name__)
+
+_INLINE_WHITESPACE_PATTERN = re.compile(r'[ \t\f\v]+')
+
+_lock = threading.Lock()
+_shared_cache = None
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Collapse whitespace within each line so prompts differing only in
+    indentation share an entry. Line breaks are kept: in OCR text each line is
+    a table row, so the same words laid out differently are a different prompt.
+    """
+    lines = (_INLINE_WHITESPACE_PATTERN.sub(' ', line).strip() for line in prompt.splitlines())
+    return '\n'.join(lines).strip()
+
+def prompt_key(model_name: str, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+    """Cache key for a prompt sent to a given model with the given generation options"""
+    key = f"{model_name}\n{normalize_prompt(prompt)}"
+    if options:
+        key += "\n" + json.dumps(options, sort_keys=True, default=str)
+    return content_key(key.encode('utf-8'))
+
+class LLMCache:
+    """
+    Response cache in front of Gemini `generate_content` calls.
+
+    Responses are keyed by the model name and a hash of the normalized prompt,
+    and stored as text in a TieredCache (in-process LRU, plus Mongo when enabled).
+    """
+
+    def __init__(self, cache: TieredCache):
+        self.cache = cache
+
+    def generate(self, model, prompt: str, use_cache: bool = True, **kwargs) -> str:
+        """
+        Get the response text for a prompt, calling the model only on a miss
+
+        Args:
+            model: Gemini model with generate_content
+            prompt: Prompt to send
+            use_cache: Set to False to always call the model and skip the cache
+            **kwargs: Generation options passed to generate_content (part of the key)
+
+        Returns:
+            str: The response text
+        """
+        return self.generate_with_usage(model, prompt, use_cache, **kwargs)[0]
+
+    def generate_with_usage(self, model, prompt: str, use_cache: bool = True,
+                            **kwargs) -> Tuple[str, Optional[Dict[str, int]]]:
+        """
+        Same as generate, but also returns the token usage Gemini reported
+
+        Returns:
+            tuple: The response text, and its token counts (None on a cache hit
+                   or when the model reports none)
+        """
+        key = prompt_key(getattr(model, 'model_name', ''), prompt, kwargs)
+        if use_cache:
+            text = self.cache.get(key)
+            if text is not None:
+                logger.info("Using cached Gemini response")
+                return text, None
+
+        response = model.generate_content(prompt, **kwargs)
+        text = response.text
+        # Don't pin an empty answer to this prompt
+        if use_cache and text and text.strip():
+            self.cache.set(key, text)
+        return text, usage_tokens(response)
+
+    def stream(self, model, prompt: str, use_cache: bool = True, **kwargs) -> Iterator[str]:
+        """
+        Stream the response text for a prompt; a cache hit is sent as one chunk
+
+        Args:
+            model: GeminiClient (needs stream_content)
+            prompt: Prompt to send
+            use_cache: Set to False to always call the model and skip the cache
+            **kwargs: Generation options passed to stream_content (part of the key)
+
+        Yields:
+            str: Response text chunks
+        """
+        key = prompt_key(getattr(model, 'model_name', ''), prompt, kwargs)
+        if use_cache:
+            text = self.cache.get(key)
+            if text is not None:
+                logger.info("Using cached Gemini response")
+                yield text
+                return
+
+        chunks = []
+        for chunk in model.stream_content(prompt, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+
+        text = ''.join(chunks)
+        if use_cache and text.strip():
+            self.cache.set(key, text)
+
+    def lookup(self, model, prompt: str, **kwargs) -> Optional[str]:
+        """Cached response text for a prompt, or None on a miss"""
+        return self.cache.get(prompt_key(getattr(model, 'model_name', ''), prompt, kwargs))
+
+    def store(self, model, prompt: str, text: str, **kwargs) -> None:
+        """Cache a response for a prompt that was answered some other way (e.g. in a batch)"""
+        if text and text.strip():
+            self.cache.set(prompt_key(getattr(model, 'model_name', ''), prompt, kwargs), text)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit and miss counters"""
+        return self.cache.get_stats()
+
+def get_llm_cache() -> LLMCache:
+    """Get the process-wide LLM response cache, building it on first use"""
+    global _shared_cache
+
+    if _shared_cache is None:
+        with _lock:
+            if _shared_cache is None:
+                ttl_seconds = float(os.environ.get('LLM_CACHE_TTL', 24 * 60 * 60))
+                persistent = None
+                if os.environ.get('LLM_CACHE_MONGO', 'false').lower() == 'true':
+                    from models.cache_store import MongoCacheStore
+                    persistent = MongoCacheStore('llm_cache', ttl_seconds)
+
+                _shared_cache = LLMCache(TieredCache(
+                    LRUCache(max_entries=int(os.environ.get('LLM_CACHE_SIZE', 512)),
+                             ttl_seconds=ttl_seconds),
+                    persistent=persistent,
+                    name='llm-cache'
+                ))
+    return _shared_cache
@@ -0,0 +1,124 @@
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+class _PendingItem:
+    """A submitted item waiting for its batch to be processed"""
+
+    def __init__(self, item: Any, group_key: Hashable):
+        self.item = item
+        self.group_key = group_key
+        self.result = None
+        self.error = None
+        # Set when the item ended up alone in its group and its caller should run it
+        self.run_inline = False
+        self.done = threading.Event()
+
+class MicroBatcher:
+    """
+    Collect items submitted from concurrent threads and process them in batches.
+
+    Items are gathered for up to `window_ms` after the first one arrives (or until
+    `max_batch_size` items are pending), grouped by their key and passed to
+    `handler(group_key, items)`, which must return one result per item in order.
+    A result that is an Exception instance is raised only for that item.
+
+    The collector thread only gathers items. A group of several items runs on a
+    pool of `max_workers` threads, so groups never wait for each other, and an
+    item that ends up alone in its group is handed back to its own caller.
+    """
+
+    def __init__(self, handler: Callable[[Hashable, List[Any]], List[Any]],
+                 window_ms: float = 20, max_batch_size: int = 8, name: str = 'micro-batcher',
+                 max_workers: int = 4):
+        self.handler = handler
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.name = name
+
+        self._pending = []
+        self._condition = threading.Condition()
+        self._worker = None
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                            thread_name_prefix=name)
+
+    def submit(self, item: Any, group_key: Hashable = None) -> Any:
+        """
+        Submit an item and block until its batch has been processed
+
+        Args:
+            item: Item to pass to the handler
+            group_key: Only items with equal keys are batched together
+
+        Returns:
+            The handler's result for this item
+        """
+        pending = _PendingItem(item, group_key)
+
+        with self._condition:
+            self._ensure_worker()
+            self._pending.append(pending)
+            self._condition.notify_all()
+
+        pending.done.wait()
+        if pending.run_inline:
+            self._process_group(group_key, [pending])
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+
+            groups = {}
+            for pending in batch:
+                groups.setdefault(pending.group_key, []).append(pending)
+
+            for group_key, group in groups.items():
+                if len(group) == 1:
+                    group[0].run_inline = True
+                    group[0].done.set()
+                else:
+                    self._executor.submit(self._process_group, group_key, group)
+
+    def _next_batch(self) -> List[_PendingItem]:
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            return batch
+
+    def _process_group(self, group_key: Hashable, group: List[_PendingItem]):
+        try:
+            results = self.handler(group_key, [pending.item for pending in group])
+            if len(results) != len(group):
+                raise RuntimeError(f"{self.name} handler returned {len(results)} results for {len(group)} items")
+        except Exception as e:
+            logger.error(f"{self.name} batch of {len(group)} failed: {str(e)}")
+            results = [e] * len(group)
+
+        for pending, result in zip(group, results):
+            if isinstance(result, Exception):
+                pending.error = result
+            else:
+                pending.result = result
+            pending.done.set()
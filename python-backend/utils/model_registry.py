@@ -0,0 +1,224 @@
+import os
+import hashlib
+import threading
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GEMINI_MODEL = 'gemini-2.0-flash'
+
+# Process-wide models, built once and shared by every route
+_lock = threading.RLock()
+_ocr_reader = None
+_ocr_backends = {}
+_gemini_configured = False
+_gemini_models = {}
+
+# Warm-up state backing the readiness endpoint
+_ready = threading.Event()
+_warmup_started = False
+_warmup_error = None
+_warmup_seconds = None
+# Extra conditions for readiness, e.g. OCR worker processes finishing their own warm-up
+_readiness_checks: Dict[str, Callable[[], bool]] = {}
+
+def get_ocr_reader():
+    """Get the shared EasyOCR reader, building it on first use"""
+    global _ocr_reader
+
+    if _ocr_reader is None:
+        with _lock:
+            if _ocr_reader is None:
+                import easyocr
+                logger.info("Initializing EasyOCR reader")
+                _ocr_reader = easyocr.Reader(['en'], gpu=False)
+                logger.info("EasyOCR reader initialized")
+    return _ocr_reader
+
+def get_ocr_backend(name: str = 'easyocr'):
+    """
+    Get a shared OCR backend, building it on first use
+
+    Args:
+        name: Backend name, one of utils.ocr_backends.OCR_BACKENDS
+
+    Returns:
+        OCRBackend
+    """
+    backend = _ocr_backends.get(name)
+    if backend is not None:
+        return backend
+
+    from utils.ocr_backends import OCR_BACKENDS, EasyOCRBackend
+    if name not in OCR_BACKENDS:
+        raise ValueError(f"Unsupported OCR backend: {name}")
+
+    with _lock:
+        if name not in _ocr_backends:
+            if name == EasyOCRBackend.name:
+                reader = get_ocr_reader()
+            else:
+                # Other backends modify their reader, so they get their own copy
+                import easyocr
+                reader = easyocr.Reader(['en'], gpu=False)
+
+            logger.info(f"Initializing OCR backend '{name}'")
+            _ocr_backends[name] = OCR_BACKENDS[name](reader)
+        return _ocr_backends[name]
+
+def _build_gemini_client(model, name):
+    """Wrap a model in a GeminiClient configured from the environment"""
+    from utils.gemini_client import GeminiClient
+
+    return GeminiClient(
+        model,
+        name=name,
+        deadline_seconds=float(os.environ.get('GEMINI_DEADLINE', 20)),
+        max_retries=int(os.environ.get('GEMINI_MAX_RETRIES', 2)),
+        retry_budget=float(os.environ.get('GEMINI_RETRY_BUDGET', 0.2)),
+        backoff_ms=float(os.environ.get('GEMINI_BACKOFF_MS', 200)),
+        hedge_percentile=float(os.environ.get('GEMINI_HEDGE_PERCENTILE', 0)),
+        breaker_failures=int(os.environ.get('GEMINI_BREAKER_FAILURES', 5)),
+        breaker_reset_seconds=float(os.environ.get('GEMINI_BREAKER_RESET', 30)),
+        max_workers=int(os.environ.get('GEMINI_CLIENT_THREADS', 16))
+    )
+
+def get_gemini_model(model_name: str = DEFAULT_GEMINI_MODEL, system_instruction: Optional[str] = None):
+    """
+    Get a shared Gemini model client
+
+    The model is wrapped in a GeminiClient (deadlines, retries, hedging and a
+    circuit breaker). With GEMINI_FAKE=true a local FakeGeminiModel is used
+    instead of the real API. Models with a system instruction are shared per
+    instruction text, so editing the instruction builds a fresh model.
+
+    Args:
+        model_name: Gemini model to use
+        system_instruction: Optional fixed instructions sent once with the model
+                            instead of with every prompt
+
+    Returns:
+        GeminiClient, or None if GEMINI_API_KEY is not set
+    """
+    global _gemini_configured
+
+    key = model_name
+    if system_instruction:
+        key = f"{model_name}#{hashlib.sha256(system_instruction.encode('utf-8')).hexdigest()[:12]}"
+
+    model = _gemini_models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        if key not in _gemini_models:
+            if os.environ.get('GEMINI_FAKE', 'false').lower() == 'true':
+                from utils.fake_gemini import FakeGeminiModel
+                logger.warning(f"Using fake Gemini model in place of '{key}'")
+                _gemini_models[key] = _build_gemini_client(
+                    FakeGeminiModel.from_env(model_name, system_instruction), key)
+                return _gemini_models[key]
+
+            api_key = os.environ.get('GEMINI_API_KEY')
+            if not api_key:
+                logger.warning("GEMINI_API_KEY environment variable is not set")
+                return None
+
+            import google.generativeai as genai
+            if not _gemini_configured:
+                genai.configure(api_key=api_key)
+                _gemini_configured = True
+
+            if system_instruction:
+                logger.info(f"Building Gemini model '{key}' with a system instruction")
+                model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+            else:
+                model = genai.GenerativeModel(model_name)
+            _gemini_models[key] = _build_gemini_client(model, key)
+        return _gemini_models[key]
+
+def warm_up(ping_gemini: bool = False) -> None:
+    """
+    Build every shared model and run a dummy inference through the OCR reader
+
+    Args:
+        ping_gemini: Also send a tiny prompt to Gemini to open the connection
+    """
+    global _warmup_error, _warmup_seconds
+
+    start = time.monotonic()
+    try:
+        warm_up_ocr(get_ocr_backend(os.environ.get('OCR_BACKEND', 'easyocr')))
+
+        model = get_gemini_model()
+        if ping_gemini and model is not None:
+            model.generate_content('ping')
+
+        _warmup_seconds = round(time.monotonic() - start, 2)
+        logger.info(f"Model warm-up finished in {_warmup_seconds}s")
+    except Exception as e:
+        # Stay not ready, so load balancers keep traffic away from a broken process
+        _warmup_error = str(e)
+        logger.error(f"Model warm-up failed: {_warmup_error}")
+        return
+
+    _ready.set()
+
+def warm_up_ocr(reader) -> None:
+    """Run a dummy inference that exercises both detection and recognition"""
+    import numpy as np
+    import cv2
+
+    sample = np.full((64, 320), 255, dtype=np.uint8)
+    cv2.putText(sample, 'IT355 12/15', (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 2)
+    reader.readtext(sample, detail=1, paragraph=False)
+
+def add_readiness_check(name: str, check: Callable[[], bool]) -> None:
+    """Also require check() to be true before the process reports ready"""
+    with _lock:
+        _readiness_checks[name] = check
+
+def start_warm_up(ping_gemini: bool = False) -> None:
+    """Warm the models up in a background thread"""
+    global _warmup_started
+
+    with _lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+
+    threading.Thread(target=warm_up, args=(ping_gemini,), name='model-warmup', daemon=True).start()
+
+def mark_ready() -> None:
+    """Mark the process ready without warming up (models load on first use)"""
+    _ready.set()
+
+def _run_readiness_checks() -> Dict[str, bool]:
+    with _lock:
+        checks = dict(_readiness_checks)
+    return {name: bool(check()) for name, check in checks.items()}
+
+def is_ready() -> bool:
+    """Whether warm-up has finished and every readiness check passes"""
+    return _ready.is_set() and all(_run_readiness_checks().values())
+
+def get_status() -> Dict[str, Any]:
+    """Get the warm-up status for the readiness endpoint"""
+    checks = _run_readiness_checks()
+    return {
+        'ready': _ready.is_set() and all(checks.values()),
+        'readinessChecks': checks,
+        'ocrReaderLoaded': _ocr_reader is not None,
+        'ocrBackends': sorted(_ocr_backends.keys()),
+        'geminiModels': sorted(_gemini_models.keys()),
+        'warmupSeconds': _warmup_seconds,
+        'warmupError': _warmup_error
+    }
+
+def get_gemini_stats() -> Dict[str, Any]:
+    """Get client statistics for every Gemini model built so far"""
+    with _lock:
+        clients = dict(_gemini_models)
+    return {name: client.get_stats() for name, client in clients.items()}
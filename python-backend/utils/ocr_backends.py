@@ -0,0 +1,159 @@
+import logging
+from typing import Any, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Blank rows between images stacked for one recognizer call
+STACK_GAP = 32
+
+class OCRBackend:
+    """
+    Interface every OCR backend implements.
+
+    Results use EasyOCR's format: a list of (bbox, text, confidence) tuples where
+    bbox holds the four corner points of the box.
+    """
+
+    name = 'base'
+
+    def detect(self, image) -> Tuple[List[Any], List[Any]]:
+        """
+        Find text regions in one image
+
+        Returns:
+            tuple: (horizontal_list, free_list) of boxes for the image
+        """
+        raise NotImplementedError
+
+    def recognize(self, image, horizontal_list, free_list, **kwargs) -> List[Any]:
+        """Recognize text inside previously detected boxes of one image"""
+        raise NotImplementedError
+
+    def recognize_batch(self, images: Sequence[Any], horizontal_list, free_list, **kwargs) -> List[List[Any]]:
+        """
+        Recognize the same boxes on several images, e.g. preprocessing variants
+
+        This default runs the images one by one; backends that can recognize
+        crops of several images in one call override it.
+        """
+        return [self.recognize(image, horizontal_list, free_list, **kwargs) for image in images]
+
+    def readtext(self, image, **kwargs) -> List[Any]:
+        """Detect and recognize text in one image"""
+        horizontal_list, free_list = self.detect(image)
+        return self.recognize(image, horizontal_list, free_list, **kwargs)
+
+    def readtext_batched(self, images: Sequence[Any], **kwargs) -> List[List[Any]]:
+        """
+        Detect and recognize text in several images
+
+        This default runs the images one by one; backends with a batched
+        detector override it.
+        """
+        return [self.readtext(image, **kwargs) for image in images]
+
+class EasyOCRBackend(OCRBackend):
+    """EasyOCR with its stock fp32 torch models"""
+
+    name = 'easyocr'
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def detect(self, image):
+        horizontal_list, free_list = self.reader.detect(image)
+        return horizontal_list[0], free_list[0]
+
+    def recognize(self, image, horizontal_list, free_list, **kwargs):
+        if not horizontal_list and not free_list:
+            return []
+        return self.reader.recognize(image,
+                                     horizontal_list=horizontal_list,
+                                     free_list=free_list,
+                                     **kwargs)
+
+    def recognize_batch(self, images, horizontal_list, free_list, **kwargs):
+        """
+        Recognize the same boxes on several same-sized images in one recognizer call
+
+        The images are stacked vertically, separated by a blank gap, and the
+        boxes are repeated at each image's offset, so the recognizer batches the
+        crops of every image together. Each reading is mapped back to its image
+        by its position and shifted back to that image's coordinates.
+        """
+        import numpy as np
+
+        images = list(images)
+        if len(images) < 2 or (not horizontal_list and not free_list):
+            return super().recognize_batch(images, horizontal_list, free_list, **kwargs)
+
+        height = images[0].shape[0]
+        if any(image.shape != images[0].shape for image in images):
+            return super().recognize_batch(images, horizontal_list, free_list, **kwargs)
+
+        gap = STACK_GAP
+        stride = height + gap
+        fill = np.full((gap,) + images[0].shape[1:], 255, dtype=images[0].dtype)
+        parts = []
+        for index, image in enumerate(images):
+            if index:
+                parts.append(fill)
+            parts.append(image)
+        stacked = np.concatenate(parts, axis=0)
+
+        # Boxes are clipped to the image, so no crop reaches into a neighbour
+        stacked_horizontal = []
+        stacked_free = []
+        for index in range(len(images)):
+            offset = index * stride
+            for x_min, x_max, y_min, y_max in horizontal_list:
+                stacked_horizontal.append([x_min, x_max, max(0, y_min) + offset, min(height, y_max) + offset])
+            for box in free_list:
+                stacked_free.append([[x, min(max(0, y), height) + offset] for x, y in box])
+
+        results = [[] for _ in images]
+        for bbox, text, confidence in self.reader.recognize(stacked,
+                                                            horizontal_list=stacked_horizontal,
+                                                            free_list=stacked_free,
+                                                            **kwargs):
+            index = min(int(min(y for _, y in bbox) // stride), len(images) - 1)
+            offset = index * stride
+            results[index].append(([[x, y - offset] for x, y in bbox], text, confidence))
+        return results
+
+    def readtext(self, image, **kwargs):
+        return self.reader.readtext(image, **kwargs)
+
+    def readtext_batched(self, images, **kwargs):
+        return self.reader.readtext_batched(images, **kwargs)
+
+class QuantizedEasyOCRBackend(EasyOCRBackend):
+    """
+    EasyOCR with the recognizer's LSTM and linear layers dynamically quantized
+    to int8. Detection stays fp32; recognition, the dominant cost on CPU, runs
+    on int8 weights.
+    """
+
+    name = 'easyocr-int8'
+
+    def __init__(self, reader):
+        import torch
+
+        engines = torch.backends.quantized.supported_engines
+        for engine in ('fbgemm', 'qnnpack'):
+            if engine in engines:
+                torch.backends.quantized.engine = engine
+                break
+
+        reader.recognizer = torch.quantization.quantize_dynamic(
+            reader.recognizer,
+            {torch.nn.LSTM, torch.nn.Linear},
+            dtype=torch.qint8
+        )
+        logger.info(f"Quantized EasyOCR recognizer to int8 ({torch.backends.quantized.engine})")
+        super().__init__(reader)
+
+OCR_BACKENDS = {
+    EasyOCRBackend.name: EasyOCRBackend,
+    QuantizedEasyOCRBackend.name: QuantizedEasyOCRBackend
+}
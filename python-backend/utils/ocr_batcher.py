@@ -0,0 +1,77 @@
+import logging
+import numpy as np
+from typing import Any, Hashable, List, Optional, Tuple
+from utils.micro_batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+class BatchingReader:
+    """
+    Drop-in wrapper around an OCR backend that batches `readtext` calls.
+
+    Concurrent `readtext` calls are collected over a short window. Screenshots
+    rarely share exact dimensions, so images are grouped by their size rounded
+    up to a multiple of `bucket_px` (and by OCR options), and padded at the
+    right and bottom with their background colour to the bucket size. Padding
+    at those edges leaves box coordinates unchanged. Each group is sent to the
+    backend's `readtext_batched` in one call (for EasyOCR, batched CRAFT
+    detection plus batched recognition), and each caller receives its own
+    result. An image with no match in its window is OCR'd unpadded on its
+    caller's thread, and batches run on `max_workers` threads. Every other
+    backend method is passed through unchanged.
+
+    Calls only meet when they come from threads of the same process, so this
+    cannot be combined with the OCR worker pool.
+    """
+
+    def __init__(self, reader, window_ms: float = 20, max_batch_size: int = 8,
+                 recognizer_batch_size: int = 8, max_workers: int = 2, bucket_px: int = 256):
+        self.reader = reader
+        self.recognizer_batch_size = recognizer_batch_size
+        self.bucket_px = max(1, bucket_px)
+        self.batcher = MicroBatcher(self._handle_batch, window_ms=window_ms,
+                                    max_batch_size=max_batch_size, name='ocr-batcher',
+                                    max_workers=max_workers)
+
+    def readtext(self, image, **kwargs):
+        """Queue an image for batched OCR and wait for its result"""
+        kwargs.setdefault('batch_size', self.recognizer_batch_size)
+        group_key = (
+            self._bucket(getattr(image, 'shape', None)),
+            str(getattr(image, 'dtype', '')),
+            tuple(sorted(kwargs.items()))
+        )
+        if group_key[0] is None:
+            # Only numpy images can be stacked into a batch
+            return self.reader.readtext(image, **kwargs)
+        return self.batcher.submit(image, group_key)
+
+    def _handle_batch(self, group_key: Hashable, images: List[Any]) -> List[Any]:
+        kwargs = dict(group_key[2])
+        if len(images) == 1:
+            return [self.reader.readtext(images[0], **kwargs)]
+
+        logger.info(f"Running batched OCR on {len(images)} images padded to {group_key[0]}")
+        return self.reader.readtext_batched([self._pad(image, group_key[0]) for image in images], **kwargs)
+
+    def _bucket(self, shape: Optional[Tuple[int, ...]]) -> Optional[Tuple[int, ...]]:
+        """Image shape with height and width rounded up to the bucket size"""
+        if shape is None or len(shape) < 2:
+            return None
+        height, width = (-(-dim // self.bucket_px) * self.bucket_px for dim in shape[:2])
+        return (height, width) + tuple(shape[2:])
+
+    def _pad(self, image, shape: Tuple[int, ...]):
+        """Pad an image at the bottom and right to `shape` with its border colour"""
+        pad_height = shape[0] - image.shape[0]
+        pad_width = shape[1] - image.shape[1]
+        if not pad_height and not pad_width:
+            return image
+
+        border = np.concatenate([image[-1].reshape(-1), image[:, -1].reshape(-1)])
+        fill = np.median(border).astype(image.dtype)
+        widths = [(0, pad_height), (0, pad_width)] + [(0, 0)] * (image.ndim - 2)
+        return np.pad(image, widths, mode='constant', constant_values=fill)
+
+    def __getattr__(self, name):
+        return getattr(self.reader, name)
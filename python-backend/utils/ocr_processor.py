@@ -1,47 +1,129 @@
-import easyocr
 import numpy as np
 import cv2
-import re
 from PIL import Image
 import io
 import logging
+import os
 import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.ocr_batcher import BatchingReader
+from utils import model_registry
+from utils.attendance_parser import (
+    PRACTICAL_INDICATORS, SUBJECT_PREFIXES, parse_attendance_text, parse_line
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Characters the recognizer is allowed to emit
+OCR_ALLOWLIST = string.ascii_letters + string.digits + '/-.'
+
+# Supported OCR modes:
+#   multi_pass       - full readtext (detection + recognition) on every variant
+#   shared_detection - detect once, recognize the same boxes on every variant
+#   cascade          - run variants in order and stop once the parse is complete
+OCR_MODES = ('multi_pass', 'shared_detection', 'cascade')
+
+# Boxes within this many pixels of an inner band edge are treated as cut off
+TILE_EDGE_MARGIN = 2
+
+def _elapsed_ms(start):
+    """Milliseconds since a time.perf_counter() reading"""
+    return round((time.perf_counter() - start) * 1000, 1)
+
 class OCRProcessor:
-    def __init__(self):
+    def __init__(self, mode=None, detection_variant=None, batch_window_ms=0, max_batch_size=8,
+                 backend=None):
         self.reader = None
-        # Common subject code prefixes in engineering colleges
-        self.subject_prefixes = [
-            'HS', 'IT', 'MA', 'CSE', 'CS', 'EC', 'DS', 'WT', 'ME', 'CE', 'EE', 'CH', 'PH',
-            'BT', 'MT', 'AE', 'PE', 'IE', 'SE', 'AI', 'ML', 'IOT', 'CY', 'HU', 'SS'
+        # OCR backend implementation, see utils/ocr_backends.py
+        self.backend = backend or os.environ.get('OCR_BACKEND', 'easyocr')
+        # Cross-request batching of readtext calls (disabled when the window is 0)
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max_batch_size
+        self.batch_bucket_px = int(os.environ.get('OCR_BATCH_BUCKET', 256))
+        self.mode = mode or os.environ.get('OCR_MODE', 'multi_pass')
+        if self.mode not in OCR_MODES:
+            raise ValueError(f"Unsupported OCR mode: {self.mode}")
+        # Preprocessing variant used for the single detection pass
+        self.detection_variant = detection_variant or os.environ.get('OCR_DETECTION_VARIANT', 'otsu')
+        # Cascade settings: variant order and the bar a stage has to clear
+        self.cascade_order = [
+            name.strip()
+            for name in os.environ.get('OCR_CASCADE_ORDER', 'otsu,adaptive,opening').split(',')
+            if name.strip()
         ]
+        self.cascade_min_subjects = int(os.environ.get('OCR_CASCADE_MIN_SUBJECTS', 1))
+        self.cascade_min_confidence = float(os.environ.get('OCR_CASCADE_MIN_CONFIDENCE', 0.6))
+        self._cascade_stats = {}
+        # Duplicate suppression and line grouping settings
+        self.nms_iou_threshold = float(os.environ.get('OCR_NMS_IOU', 0.5))
+        self.line_tolerance = float(os.environ.get('OCR_LINE_TOLERANCE', 0.6))
+        self._stats_lock = threading.Lock()
+        # Tiling of tall screenshots (disabled when the tile height is 0)
+        self.tile_height = int(os.environ.get('OCR_TILE_HEIGHT', 0))
+        self.tile_overlap = int(os.environ.get('OCR_TILE_OVERLAP', 120))
+        self.tile_workers = int(os.environ.get('OCR_TILE_WORKERS', 2))
+        if self.tile_height and self.tile_overlap >= self.tile_height:
+            raise ValueError("OCR_TILE_OVERLAP must be smaller than OCR_TILE_HEIGHT")
+        # Common subject code prefixes in engineering colleges
+        self.subject_prefixes = SUBJECT_PREFIXES
 
     def _initialize_reader(self):
         if self.reader is None:
-            logger.info("Initializing EasyOCR reader")
-            self.reader = easyocr.Reader(['en'], gpu=False)
-            logger.info("EasyOCR reader initialized")
+            self.reader = model_registry.get_ocr_backend(self.backend)
+            if self.batch_window_ms > 0:
+                logger.info(f"Batching OCR requests over {self.batch_window_ms}ms windows")
+                self.reader = BatchingReader(self.reader,
+                                             window_ms=self.batch_window_ms,
+                                             max_batch_size=self.max_batch_size,
+                                             bucket_px=self.batch_bucket_px)
 
     def process_image(self, image_data):
         """
         Process the image data and extract attendance information
 
         Args:
-            image_data: Image data as bytes, file-like object, or file path
+            image_data: Image data as a decoded numpy array, bytes, file-like
+                        object, or file path
 
         Returns:
             str: Raw OCR text that can be further processed
         """
+        return self.process_image_detailed(image_data)['text']
+
+    def process_image_detailed(self, image_data, on_event=None):
+        """
+        Process the image data and report how the text was obtained
+
+        Args:
+            image_data: Image data as a decoded numpy array, bytes, file-like
+                        object, or file path
+            on_event: Optional callback(stage, payload) called as each stage
+                      (preprocessing, every OCR variant) finishes
+
+        Returns:
+            dict: OCR text along with the mode, the variant that produced the
+                  final result (cascade mode only), the variants that were run
+                  and the stage events with their timings
+        """
         self._initialize_reader()
 
+        stages = []
+
+        def report(stage, **payload):
+            stages.append({'stage': stage, **payload})
+            if on_event is not None:
+                on_event(stage, payload)
+
         try:
             # Convert bytes to numpy array or handle file path
-            if isinstance(image_data, bytes):
+            if isinstance(image_data, np.ndarray):  # Already decoded
+                image_np = image_data
+            elif isinstance(image_data, bytes):
                 image = Image.open(io.BytesIO(image_data))
                 image_np = np.array(image)
             elif isinstance(image_data, str):  # Treat as file path
@@ -55,158 +137,477 @@ class OCRProcessor:
             else:
                 gray = image_np
 
-            # Enhanced image preprocessing for better OCR
-            # Apply adaptive thresholding for better text extraction
-            gray = cv2.GaussianBlur(gray, (3, 3), 0)
-
-            # Try different preprocessing techniques
-            # 1. Adaptive thresholding
-            adaptive_thresh = cv2.adaptiveThreshold(
-                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-            )
-
-            # 2. OTSU thresholding
-            _, otsu_thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-
-            # 3. Noise removal
-            kernel = np.ones((1, 1), np.uint8)
-            opening = cv2.morphologyEx(otsu_thresh, cv2.MORPH_OPEN, kernel)
-
-            # Perform OCR on both preprocessed images and combine results
-            logger.info("Running OCR on image with multiple preprocessing techniques")
-
-            # Try with adaptive thresholding
-            adaptive_results = self.reader.readtext(adaptive_thresh, detail=1,
-                                                   paragraph=False,
-                                                   allowlist=string.ascii_letters + string.digits + '/-.')
-
-            # Try with OTSU thresholding
-            otsu_results = self.reader.readtext(otsu_thresh, detail=1,
-                                               paragraph=False,
-                                               allowlist=string.ascii_letters + string.digits + '/-.')
-
-            # Try with noise removal
-            opening_results = self.reader.readtext(opening, detail=1,
-                                                 paragraph=False,
-                                                 allowlist=string.ascii_letters + string.digits + '/-.')
-
-            # Combine results from all preprocessing methods
-            all_results = adaptive_results + otsu_results + opening_results
-
-            # Extract text and coordinates
-            structured_results = []
-            for result in all_results:
-                bbox, text, confidence = result
-                if confidence > 0.3:  # Filter low confidence results
-                    structured_results.append({
-                        'text': text,
-                        'bbox': bbox,
-                        'confidence': confidence
-                    })
-
-            # Sort results by vertical position (top to bottom)
-            structured_results.sort(key=lambda x: x['bbox'][0][1])
-
-            # Group results by lines based on y-coordinate proximity
-            line_groups = []
-            current_line = []
-            last_y = None
-
-            for result in structured_results:
-                y_coord = result['bbox'][0][1]
-
-                if last_y is None or abs(y_coord - last_y) < 20:  # Threshold for same line
-                    current_line.append(result)
-                else:
-                    if current_line:
-                        line_groups.append(current_line)
-                    current_line = [result]
-
-                last_y = y_coord
-
-            if current_line:
-                line_groups.append(current_line)
-
-            # Sort each line by horizontal position (left to right)
-            for line in line_groups:
-                line.sort(key=lambda x: x['bbox'][0][0])
+            if self.tile_height > 0 and gray.shape[0] > self.tile_height + self.tile_overlap:
+                structured_results, variant, variants_run = self._run_tiled(gray, report)
+            else:
+                structured_results, variant, variants_run = self._run_image(gray, report)
 
-            # Construct lines of text
-            text_lines = []
-            for line in line_groups:
-                line_text = ' '.join([item['text'] for item in line])
-                text_lines.append(line_text)
+            # Counted once per image, however many tiles it was split into
+            if self.mode == 'cascade':
+                self._record_cascade_result(variant or 'incomplete')
 
-            # Join lines with newlines for better structure
-            text = '\n'.join(text_lines)
+            text = self._assemble_text(structured_results)
 
             logger.info(f"OCR completed. Extracted text: {text[:100]}...")
 
-            # Return the raw text for further processing
-            return text
+            return {
+                'text': text,
+                'mode': self.mode,
+                'variant': variant,
+                'variantsRun': variants_run,
+                'stages': stages
+            }
 
         except Exception as e:
             logger.error(f"Error processing image: {str(e)}")
             raise
 
-    def _extract_subject_code(self, text):
+    def get_cascade_stats(self):
         """
-        Extract subject code from text using various patterns
+        Get how often each cascade variant produced the final result
+
+        Returns:
+            dict: Variant name mapped to the number of images it completed,
+                  plus 'incomplete' for images no variant fully parsed
+        """
+        with self._stats_lock:
+            return dict(self._cascade_stats)
+
+    def _run_image(self, gray, report, min_subjects=None):
+        """
+        Preprocess an image and run OCR on it with the configured mode
 
         Args:
-            text: Text to extract subject code from
+            gray: Grayscale image as a numpy array
+            report: Callback(stage, **payload) for progress events
+            min_subjects: Subjects a cascade stage must find (default
+                          cascade_min_subjects)
 
         Returns:
-            tuple: (subject_code, subject_name)
+            tuple: (structured_results, succeeded_variant or None, variants_run)
+        """
+        start = time.perf_counter()
+        variants = self._preprocess(gray)
+        report('preprocessed', variants=list(variants.keys()), ms=_elapsed_ms(start))
+
+        if self.mode == 'shared_detection':
+            logger.info("Running OCR with shared detection across preprocessing variants")
+            return self._run_shared_detection(variants, report), None, list(variants.keys())
+        if self.mode == 'cascade':
+            logger.info("Running OCR cascade over preprocessing variants")
+            return self._run_cascade(variants, report, min_subjects)
+
+        logger.info("Running OCR on image with multiple preprocessing techniques")
+        return self._run_multi_pass(variants, report), None, list(variants.keys())
+
+    def _run_tiled(self, gray, report):
+        """
+        OCR a tall image as overlapping horizontal bands in parallel
+
+        Each band is preprocessed and OCR'd on its own, so memory depends on the
+        band height and the number of tile workers rather than the image height.
+        Boxes cut by a band edge are dropped, since the overlap guarantees the
+        neighbouring band holds them whole. The remaining duplicates from the
+        overlaps are removed by the usual box suppression.
+
+        Args:
+            gray: Grayscale image as a numpy array
+            report: Callback(stage, **payload) for progress events
+
+        Returns:
+            tuple: (structured_results, succeeded_variant or None, variants_run).
+                   In cascade mode the variant is the latest stage any band
+                   needed, or None if a band never completed or the stitched
+                   result does not pass the cascade check.
+        """
+        height = gray.shape[0]
+        step = self.tile_height - self.tile_overlap
+        bands = []
+        for top in range(0, height, step):
+            bottom = min(top + self.tile_height, height)
+            bands.append((top, bottom))
+            if bottom == height:
+                break
+
+        logger.info(f"Running tiled OCR on {len(bands)} bands of a {height}px tall image")
+
+        def run_band(index):
+            top, bottom = bands[index]
+
+            def band_report(stage, **payload):
+                report(stage, tile=index, **payload)
+
+            # Slicing keeps a view of the band, no copy. A band may hold no
+            # subject rows at all (header, footer), so the minimum subject
+            # count is only checked on the stitched result.
+            results, variant, variants_run = self._run_image(gray[top:bottom], band_report, min_subjects=0)
+
+            kept = []
+            for result in results:
+                ys = [y for _, y in result['bbox']]
+                if index > 0 and min(ys) <= TILE_EDGE_MARGIN:
+                    continue
+                if index < len(bands) - 1 and max(ys) >= bottom - top - TILE_EDGE_MARGIN:
+                    continue
+                kept.append({
+                    **result,
+                    'bbox': [[x, y + top] for x, y in result['bbox']]
+                })
+            return kept, variant, variants_run
+
+        with ThreadPoolExecutor(max_workers=self.tile_workers) as executor:
+            band_results = list(executor.map(run_band, range(len(bands))))
+
+        structured_results = []
+        variants_run = []
+        for results, _, band_variants in band_results:
+            structured_results.extend(results)
+            variants_run.extend(name for name in band_variants if name not in variants_run)
+
+        structured_results = self._deduplicate_boxes(structured_results)
+
+        # Every band runs the cascade in the same order, so variants_run follows it
+        variant = None
+        band_variants = [band_variant for _, band_variant, _ in band_results]
+        if self.mode == 'cascade' and None not in band_variants:
+            _, _, complete = self._evaluate_cascade_stage(structured_results)
+            if complete:
+                variant = max(band_variants, key=variants_run.index)
+
+        return structured_results, variant, variants_run
+
+    def _preprocess(self, gray):
+        """
+        Build the preprocessing variants that OCR is run against
+
+        Args:
+            gray: Grayscale image as a numpy array
+
+        Returns:
+            dict: Variant name mapped to the preprocessed image, in pass order
+        """
+        # Enhanced image preprocessing for better OCR
+        # Apply adaptive thresholding for better text extraction
+        gray = cv2.GaussianBlur(gray, (3, 3), 0)
+
+        # Try different preprocessing techniques
+        # 1. Adaptive thresholding
+        adaptive_thresh = cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+        )
+
+        # 2. OTSU thresholding
+        _, otsu_thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        # 3. Noise removal
+        kernel = np.ones((1, 1), np.uint8)
+        opening = cv2.morphologyEx(otsu_thresh, cv2.MORPH_OPEN, kernel)
+
+        return {
+            'adaptive': adaptive_thresh,
+            'otsu': otsu_thresh,
+            'opening': opening
+        }
+
+    def _run_multi_pass(self, variants, report):
+        """
+        Run full detection and recognition on every preprocessing variant
+
+        Args:
+            variants: Variant name mapped to the preprocessed image
+            report: Callback(stage, **payload) for progress events
+
+        Returns:
+            list: Filtered OCR results from all variants
+        """
+        all_results = []
+        for name, image in variants.items():
+            start = time.perf_counter()
+            results = self.reader.readtext(image, detail=1,
+                                           paragraph=False,
+                                           allowlist=OCR_ALLOWLIST)
+            all_results.extend(results)
+            report('ocr_variant', variant=name, boxes=len(results), ms=_elapsed_ms(start))
+
+        return self._filter_results(all_results)
+
+    def _run_shared_detection(self, variants, report):
+        """
+        Detect text boxes once, then recognize the same boxes on every variant
+
+        CRAFT detection is the most expensive stage, so it runs a single time on
+        the detection variant. Only the recognizer runs per variant, and the most
+        confident reading is kept for each box.
+
+        Args:
+            variants: Variant name mapped to the preprocessed image
+            report: Callback(stage, **payload) for progress events
+
+        Returns:
+            list: Filtered OCR results, one per detected box
+        """
+        detection_image = variants.get(self.detection_variant)
+        if detection_image is None:
+            detection_image = next(iter(variants.values()))
+
+        start = time.perf_counter()
+        horizontal_list, free_list = self.reader.detect(detection_image)
+        report('ocr_detection', boxes=len(horizontal_list) + len(free_list), ms=_elapsed_ms(start))
+
+        if not horizontal_list and not free_list:
+            return []
+
+        best_by_box = {}
+        start = time.perf_counter()
+        variant_results = self.reader.recognize_batch(list(variants.values()),
+                                                      horizontal_list,
+                                                      free_list,
+                                                      detail=1,
+                                                      paragraph=False,
+                                                      allowlist=OCR_ALLOWLIST)
+        # Variants are recognized as one batch, so they share its timing
+        batch_ms = _elapsed_ms(start)
+        for name, results in zip(variants.keys(), variant_results):
+            report('ocr_variant', variant=name, boxes=len(results), ms=batch_ms)
+
+        for results in variant_results:
+            for bbox, text, confidence in results:
+                key = tuple((int(x), int(y)) for x, y in bbox)
+                best = best_by_box.get(key)
+                if best is None or confidence > best[2]:
+                    best_by_box[key] = (bbox, text, confidence)
+
+        return self._filter_results(best_by_box.values())
+
+    def _run_cascade(self, variants, report, min_subjects=None):
+        """
+        Run variants one at a time and stop once the parse looks complete
+
+        Each stage merges the readings of every variant run so far, so the last
+        stage is equivalent to multi-pass OCR. A stage is accepted when it
+        yields at least the configured number of subjects, every subject code
+        seen has an attendance pair, and the confidence of the readings on
+        those lines clears the threshold.
+
+        Args:
+            variants: Variant name mapped to the preprocessed image
+            report: Callback(stage, **payload) for progress events
+            min_subjects: Subjects a stage must find (default cascade_min_subjects)
+
+        Returns:
+            tuple: (structured_results, succeeded_variant or None, variants_run)
+        """
+        order = [name for name in self.cascade_order if name in variants]
+        order += [name for name in variants if name not in order]
+
+        all_results = []
+        variants_run = []
+        structured_results = []
+
+        for name in order:
+            start = time.perf_counter()
+            results = self.reader.readtext(variants[name], detail=1,
+                                           paragraph=False,
+                                           allowlist=OCR_ALLOWLIST)
+            all_results.extend(results)
+            variants_run.append(name)
+            structured_results = self._filter_results(all_results)
+
+            subjects_found, min_confidence, complete = self._evaluate_cascade_stage(structured_results,
+                                                                                    min_subjects)
+            logger.info(f"Cascade stage '{name}': {subjects_found} subjects, "
+                        f"min confidence {min_confidence:.2f}, complete={complete}")
+            report('ocr_variant', variant=name, boxes=len(results), subjects=subjects_found,
+                   complete=complete, ms=_elapsed_ms(start))
+
+            if complete:
+                return structured_results, name, variants_run
+
+        return structured_results, None, variants_run
+
+    def _evaluate_cascade_stage(self, structured_results, min_subjects=None):
+        """
+        Check whether the readings of a cascade stage parse completely
+
+        Args:
+            structured_results: Structured results with text, bbox and confidence
+            min_subjects: Subjects that must be found (default cascade_min_subjects).
+                          With 0, readings without any subject row are complete.
+
+        Returns:
+            tuple: (subjects_found, min_confidence, complete)
         """
-        # Build a comprehensive regex pattern for subject codes
-        prefix_pattern = '|'.join(self.subject_prefixes)
+        candidate_subjects = set()
+        found_subjects = set()
+        min_confidence = 1.0
+        for line in self._group_lines(structured_results):
+            parsed = parse_line(' '.join(item['text'] for item in line))
+            if parsed is None:
+                continue
+
+            subject_key = (parsed['subjectCode'], parsed['classType'])
+            candidate_subjects.add(subject_key)
+            if parsed['attended'] is not None and parsed['total']:
+                found_subjects.add(subject_key)
+                min_confidence = min(min_confidence, min(item['confidence'] for item in line))
 
-        # Different patterns to try
-        patterns = [
-            # Standard format: 2-3 letters followed by numbers (e.g., CS101)
-            rf'({prefix_pattern})[-\s]*(\d+[A-Z]?(?:\.\d+)?)',
+        subjects_found = len(found_subjects)
+        if not subjects_found:
+            min_confidence = 0.0
 
-            # Format with slash: CS/101
-            rf'({prefix_pattern})\s*/\s*(\d+[A-Z]?(?:\.\d+)?)',
+        if min_subjects is None:
+            min_subjects = self.cascade_min_subjects
 
-            # Format with dash: CS-101
-            rf'({prefix_pattern})\s*-\s*(\d+[A-Z]?(?:\.\d+)?)',
+        complete = (
+            subjects_found >= min_subjects
+            and found_subjects == candidate_subjects
+            and (not found_subjects or min_confidence >= self.cascade_min_confidence)
+        )
+        return subjects_found, min_confidence, complete
+
+    def _record_cascade_result(self, variant):
+        """Count which cascade variant produced the final result"""
+        with self._stats_lock:
+            self._cascade_stats[variant] = self._cascade_stats.get(variant, 0) + 1
+
+    def _filter_results(self, results):
+        """
+        Drop low confidence readings, convert results to dictionaries and
+        suppress duplicate readings of the same region
+
+        Args:
+            results: Iterable of (bbox, text, confidence) tuples
 
-            # Format with space: CS 101
-            rf'({prefix_pattern})\s+(\d+[A-Z]?(?:\.\d+)?)'
+        Returns:
+            list: Structured results with text, bbox and confidence
+        """
+        structured_results = []
+        for bbox, text, confidence in results:
+            if confidence > 0.3:  # Filter low confidence results
+                structured_results.append({
+                    'text': text,
+                    'bbox': bbox,
+                    'confidence': confidence
+                })
+        return self._deduplicate_boxes(structured_results)
+
+    def _deduplicate_boxes(self, structured_results):
+        """
+        Non-maximum suppression across readings from all preprocessing variants
+
+        The same text box is usually read once per variant. Boxes are compared by
+        the IoU of their axis-aligned bounds and only the most confident reading
+        of each overlapping group is kept.
+
+        Args:
+            structured_results: Structured results with text, bbox and confidence
+
+        Returns:
+            list: Results with duplicates removed, in descending confidence order
+        """
+        if len(structured_results) < 2:
+            return structured_results
+
+        quads = np.array([result['bbox'] for result in structured_results], dtype=np.float32)
+        confidences = np.array([result['confidence'] for result in structured_results], dtype=np.float32)
+
+        order = np.argsort(-confidences, kind='stable')
+        mins = quads[order].min(axis=1)
+        maxs = quads[order].max(axis=1)
+        areas = np.prod(np.maximum(maxs - mins, 0), axis=1)
+
+        # Pairwise IoU of all boxes in one shot
+        inter_mins = np.maximum(mins[:, None, :], mins[None, :, :])
+        inter_maxs = np.minimum(maxs[:, None, :], maxs[None, :, :])
+        intersection = np.prod(np.clip(inter_maxs - inter_mins, 0, None), axis=2)
+        union = areas[:, None] + areas[None, :] - intersection
+        iou = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+        keep = np.ones(len(order), dtype=bool)
+        for i in range(len(order)):
+            if keep[i]:
+                keep[i + 1:] &= iou[i, i + 1:] <= self.nms_iou_threshold
+
+        return [structured_results[index] for index in order[keep]]
+
+    def _group_lines(self, structured_results):
+        """
+        Group OCR results into rows based on their vertical position
+
+        A box joins the current row when its vertical center is within a
+        fraction of the median box height of the row's center, so grouping
+        scales with the text size of the screenshot.
+
+        Args:
+            structured_results: Structured results with text, bbox and confidence
+
+        Returns:
+            list: Lines of results, top to bottom, each sorted left to right
+        """
+        if not structured_results:
+            return []
+
+        quads = np.array([result['bbox'] for result in structured_results], dtype=np.float32)
+        tops = quads[:, :, 1].min(axis=1)
+        bottoms = quads[:, :, 1].max(axis=1)
+        lefts = quads[:, :, 0].min(axis=1)
+        centers = (tops + bottoms) / 2
+        tolerance = max(float(np.median(bottoms - tops)), 1.0) * self.line_tolerance
+
+        # Walk boxes top to bottom and cluster them by center
+        line_groups = []
+        current_line = []
+        line_center = None
+
+        for index in np.argsort(centers, kind='stable'):
+            if line_center is None or abs(centers[index] - line_center) <= tolerance:
+                current_line.append(index)
+            else:
+                line_groups.append(current_line)
+                current_line = [index]
+            line_center = float(np.mean(centers[current_line]))
+
+        line_groups.append(current_line)
+
+        # Sort each line by horizontal position (left to right)
+        return [
+            [structured_results[index] for index in sorted(line, key=lambda i: lefts[i])]
+            for line in line_groups
         ]
 
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                prefix = match.group(1).upper()
-                code = match.group(2)
-                subject_code = f"{prefix}{code}"
-
-                # Try to extract full subject name if available
-                full_name_match = re.search(rf'{prefix}\s*{code}\s*[-:]\s*([A-Za-z\s&]+)', text)
-                if full_name_match:
-                    subject_name = f"{subject_code} - {full_name_match.group(1).strip()}"
-                else:
-                    subject_name = subject_code
-
-                return subject_code, subject_name
-
-        # If no match found with specific patterns, try a more general approach
-        for prefix in self.subject_prefixes:
-            if prefix in text.upper():
-                # Find the index of the prefix
-                idx = text.upper().find(prefix)
-                # Extract a substring that might contain the code
-                potential_code = text[idx:idx+10]
-                # Try to extract numbers following the prefix
-                code_match = re.search(rf'{prefix}\s*(\d+[A-Z]?(?:\.\d+)?)', potential_code, re.IGNORECASE)
-                if code_match:
-                    subject_code = f"{prefix}{code_match.group(1)}"
-                    return subject_code, subject_code
-
-        return None, None
+    def _assemble_text(self, structured_results):
+        """
+        Group OCR results into lines and join them into text
+
+        Args:
+            structured_results: Structured results with text, bbox and confidence
+
+        Returns:
+            str: Reconstructed text with one line per row
+        """
+        # Construct lines of text
+        text_lines = []
+        for line in self._group_lines(structured_results):
+            line_text = ' '.join([item['text'] for item in line])
+            text_lines.append(line_text)
+
+        # Join lines with newlines for better structure
+        return '\n'.join(text_lines)
+
+    def _extract_subject_code(self, text):
+        """
+        Extract subject code from text using various patterns
+
+        Args:
+            text: Text to extract subject code from
+
+        Returns:
+            tuple: (subject_code, subject_name)
+        """
+        parsed = parse_line(text)
+        if parsed is None:
+            return None, None
+        return parsed['subjectCode'], parsed['subjectName']
 
     def _extract_attendance_numbers(self, text):
         """
@@ -218,25 +619,10 @@ class OCRProcessor:
         Returns:
             tuple: (attended, total)
         """
-        # Different patterns for attendance numbers
-        patterns = [
-            r'(\d+)\s*\/\s*(\d+)',  # Standard format: 12/15
-            r'(\d+)\s*out\s*of\s*(\d+)',  # Text format: 12 out of 15
-            r'attended\s*(\d+)\s*out\s*of\s*(\d+)',  # Descriptive: attended 12 out of 15
-            r'present\s*(\d+)\s*total\s*(\d+)'  # Alternative: present 12 total 15
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    attended = int(match.group(1))
-                    total = int(match.group(2))
-                    return attended, total
-                except (ValueError, TypeError):
-                    continue
-
-        return None, None
+        parsed = parse_line(text)
+        if parsed is None:
+            return None, None
+        return parsed['attended'], parsed['total']
 
     def _determine_class_type(self, text):
         """
@@ -248,9 +634,7 @@ class OCRProcessor:
         Returns:
             str: Class type (THEORY or PRACTICAL)
         """
-        practical_indicators = ['lab', 'practical', 'practice', 'workshop', 'prac']
-
-        for indicator in practical_indicators:
+        for indicator in PRACTICAL_INDICATORS:
             if indicator.upper() in text.upper():
                 return "PRACTICAL"
 
@@ -268,63 +652,12 @@ class OCRProcessor:
         """
         logger.info("Parsing attendance data from OCR text")
 
-        # Split text into lines for processing
-        lines = text.split('\n')
-
-        records = []
-        total_attended = 0
-        total_classes = 0
-        processed_subjects = set()  # To avoid duplicates
-
-        # Process each line
-        for line in lines:
-            # Skip empty lines
-            if not line.strip():
-                continue
-
-            # Extract subject code and name
-            subject_code, subject_name = self._extract_subject_code(line)
-
-            if subject_code:
-                # Avoid processing the same subject multiple times
-                if subject_code in processed_subjects:
-                    continue
-
-                # Determine class type
-                class_type = self._determine_class_type(line)
-
-                # Extract attendance numbers
-                attended, total = self._extract_attendance_numbers(line)
-
-                if attended is not None and total is not None and total > 0:
-                    # Calculate percentage
-                    percentage = round((attended / total) * 100, 2)
-
-                    # Add to records
-                    records.append({
-                        "subjectName": subject_name,
-                        "classType": class_type,
-                        "attended": attended,
-                        "total": total,
-                        "percentage": percentage
-                    })
-
-                    # Update totals
-                    total_attended += attended
-                    total_classes += total
+        # student_id is a placeholder, would be determined by user authentication
+        result = parse_attendance_text(text, student_id="123")
 
-                    # Mark subject as processed
-                    processed_subjects.add(subject_code)
+        for record in result['records']:
+            logger.info(f"Extracted subject: {record['subjectName']}, Type: {record['classType']}, "
+                        f"Attendance: {record['attended']}/{record['total']}")
+        logger.info(f"Parsed {len(result['records'])} subjects with overall attendance: {result['overallPercentage']}%")
 
-                    logger.info(f"Extracted subject: {subject_name}, Type: {class_type}, Attendance: {attended}/{total}")
-
-        # Calculate overall percentage
-        overall_percentage = round((total_attended / total_classes) * 100, 2) if total_classes > 0 else 0
-
-        logger.info(f"Parsed {len(records)} subjects with overall attendance: {overall_percentage}%")
-
-        return {
-            "student_id": "123",  # Placeholder, would be determined by user authentication
-            "records": records,
-            "overallPercentage": overall_percentage
-        }
\ No newline at end of file
+        return result
@@ -0,0 +1,122 @@
+import multiprocessing
+import logging
+import os
+import threading
+from utils import model_registry
+
+logger = logging.getLogger(__name__)
+
+# OCR processor inherited by forked workers. It is set in the master process
+# before the pool is created, so every worker shares the loaded model weights
+# copy-on-write instead of loading its own copy.
+_worker_processor = None
+
+def _init_worker(torch_threads, warm_workers):
+    """Configure torch threading in a freshly forked worker, and warm it up if asked"""
+    import torch
+    torch.set_num_threads(torch_threads)
+
+    if warm_workers is not None:
+        # Warm up after the fork: torch state from a master-side inference
+        # does not carry over safely into forked children
+        try:
+            model_registry.warm_up_ocr(_worker_processor.reader)
+        except Exception as e:
+            logger.error(f"OCR worker {os.getpid()} warm-up failed: {str(e)}")
+            return
+        with warm_workers.get_lock():
+            warm_workers.value += 1
+
+    logger.info(f"OCR worker {os.getpid()} ready with {torch_threads} torch thread(s)")
+
+def _process_image_job(image_data):
+    """Run OCR for one image inside a worker process"""
+    return _worker_processor.process_image_detailed(image_data)
+
+class OCRWorkerPool:
+    """
+    Pre-forked pool of OCR worker processes.
+
+    The master process loads the EasyOCR reader once and then forks the workers,
+    which run `process_image` jobs submitted over IPC. Each worker has its own
+    torch thread count so CPU usage scales predictably with the number of workers
+    instead of every request thread competing for the GIL and torch's intra-op pool.
+    With `warm_up`, each worker runs a dummy inference before taking jobs, and
+    `is_warm()` turns true once all of them have.
+    """
+
+    def __init__(self, ocr_processor, workers, torch_threads=1, timeout=120, warm_up=False):
+        global _worker_processor
+
+        self.mode = ocr_processor.mode
+        self.timeout = timeout
+        self.workers = workers
+        self._cascade_stats = {}
+        self._stats_lock = threading.Lock()
+
+        # Load the model in the master so the workers inherit it
+        ocr_processor._initialize_reader()
+        _worker_processor = ocr_processor
+
+        logger.info(f"Starting OCR worker pool with {workers} workers")
+        context = multiprocessing.get_context('fork')
+        self._warm_workers = context.Value('i', 0) if warm_up else None
+        self.pool = context.Pool(processes=workers,
+                                 initializer=_init_worker,
+                                 initargs=(torch_threads, self._warm_workers))
+
+    def is_warm(self):
+        """Whether every worker has finished its warm-up (always true without warm-up)"""
+        if self._warm_workers is None:
+            return True
+        return self._warm_workers.value >= self.workers
+
+    def process_image(self, image_data):
+        """
+        Run OCR on an image in a worker process
+
+        Args:
+            image_data: Decoded numpy array, bytes or file path (must be picklable)
+
+        Returns:
+            str: Raw OCR text that can be further processed
+        """
+        return self.process_image_detailed(image_data)['text']
+
+    def process_image_detailed(self, image_data, on_event=None):
+        """
+        Run OCR on an image in a worker process and report how it was obtained
+
+        Args:
+            image_data: Decoded numpy array, bytes or file path (must be picklable)
+            on_event: Optional callback(stage, payload). Workers cannot call back
+                      across processes, so stage events are replayed once the
+                      job completes.
+
+        Returns:
+            dict: Same structure as OCRProcessor.process_image_detailed
+        """
+        result = self.pool.apply_async(_process_image_job, (image_data,)).get(self.timeout)
+
+        if on_event is not None:
+            for stage in result['stages']:
+                payload = {key: value for key, value in stage.items() if key != 'stage'}
+                on_event(stage['stage'], payload)
+
+        # Cascade counters live in the workers, so aggregate them here
+        if result['mode'] == 'cascade':
+            variant = result['variant'] or 'incomplete'
+            with self._stats_lock:
+                self._cascade_stats[variant] = self._cascade_stats.get(variant, 0) + 1
+
+        return result
+
+    def get_cascade_stats(self):
+        """Get how often each cascade variant produced the final result"""
+        with self._stats_lock:
+            return dict(self._cascade_stats)
+
+    def close(self):
+        """Stop the worker processes"""
+        self.pool.terminate()
+        self.pool.join()
@@ -0,0 +1,156 @@
+import heapq
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+DISTRIBUTION_STRATEGIES = ('balanced', 'attendance', 'priority', 'classes')
+
+# Lower priority subjects can take more skips (Low > Medium > High)
+PRIORITY_WEIGHTS = {'high': 1.0, 'medium': 2.0, 'low': 3.0}
+
+# Attendance thresholds from the skip planning rules
+LOW_ATTENDANCE = 75
+HIGH_ATTENDANCE = 90
+LOW_ATTENDANCE_FACTOR = 0.25
+HIGH_ATTENDANCE_FACTOR = 1.5
+
+# A subject never gets more skips than a month of its classes
+WEEKS_CAP = 4
+
+class SkipAllocator:
+    """
+    Deterministic split of allowed skips across subjects.
+
+    Each subject gets a weight from the chosen strategy, scaled down below 75%
+    attendance and up above 90%. Skips are then handed out one at a time by
+    the Sainte-Laguë highest-averages method (the subject with the largest
+    weight / (skips + 0.5) gets the next one), never past weeklyClasses × 4.
+    The result is proportional to the weights, in whole skips, and ties are
+    broken by subject order so the same input always gives the same plan.
+    """
+
+    def allocate(self, subjects: List[Dict[str, Any]], allowed_skips: int,
+                 strategy: str = 'balanced') -> Dict[str, Any]:
+        """
+        Distribute skips across subjects
+
+        Args:
+            subjects: Subjects with id, name, attendance, weeklyClasses and priority
+            allowed_skips: Number of skips to distribute
+            strategy: One of DISTRIBUTION_STRATEGIES
+
+        Returns:
+            dict: skipDistribution, reasoning, summary and totalSkips, keyed by
+                  subject id as the skip planner expects
+
+        Raises:
+            ValueError: If the strategy, skip count or a subject is invalid
+        """
+        if strategy not in DISTRIBUTION_STRATEGIES:
+            raise ValueError(f"Unknown distribution strategy: {strategy}")
+
+        allowed_skips = int(allowed_skips)
+        if allowed_skips < 0:
+            raise ValueError("allowedSkips cannot be negative")
+
+        prepared = [self._prepare_subject(subject) for subject in subjects]
+        for subject in prepared:
+            subject['weight'] = self._weight(subject, strategy)
+
+        skips = [0] * len(prepared)
+        heap = [
+            (-subject['weight'] / 0.5, index)
+            for index, subject in enumerate(prepared)
+            if subject['cap'] > 0 and subject['weight'] > 0
+        ]
+        heapq.heapify(heap)
+
+        assigned = 0
+        while assigned < allowed_skips and heap:
+            _, index = heapq.heappop(heap)
+            skips[index] += 1
+            assigned += 1
+            if skips[index] < prepared[index]['cap']:
+                heapq.heappush(heap, (-prepared[index]['weight'] / (skips[index] + 0.5), index))
+
+        skip_distribution = {}
+        reasoning = {}
+        for subject, subject_skips in zip(prepared, skips):
+            skip_distribution[subject['id']] = subject_skips
+            reasoning[subject['id']] = self._reason(subject, subject_skips, strategy)
+
+        return {
+            'skipDistribution': skip_distribution,
+            'reasoning': reasoning,
+            'summary': self._summary(prepared, allowed_skips, assigned, strategy),
+            'totalSkips': assigned
+        }
+
+    def _prepare_subject(self, subject: Dict[str, Any]) -> Dict[str, Any]:
+        if not isinstance(subject, dict) or subject.get('id') is None:
+            raise ValueError("Every subject needs an id")
+
+        try:
+            attendance = float(subject.get('attendance', 0))
+            weekly_classes = max(0, int(subject.get('weeklyClasses', 0)))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid attendance or weeklyClasses for subject {subject['id']}")
+
+        priority = str(subject.get('priority', 'Medium'))
+        return {
+            'id': str(subject['id']),
+            'name': subject.get('name') or str(subject['id']),
+            'attendance': attendance,
+            'weeklyClasses': weekly_classes,
+            'priority': priority,
+            'priorityWeight': PRIORITY_WEIGHTS.get(priority.lower(), PRIORITY_WEIGHTS['medium']),
+            'cap': weekly_classes * WEEKS_CAP
+        }
+
+    def _weight(self, subject: Dict[str, Any], strategy: str) -> float:
+        attendance_share = max(0.0, subject['attendance']) / 100
+
+        if strategy == 'attendance':
+            weight = attendance_share
+        elif strategy == 'priority':
+            weight = subject['priorityWeight']
+        elif strategy == 'classes':
+            weight = float(subject['weeklyClasses'])
+        else:
+            weight = attendance_share * subject['weeklyClasses'] * subject['priorityWeight']
+
+        if subject['attendance'] < LOW_ATTENDANCE:
+            weight *= LOW_ATTENDANCE_FACTOR
+        elif subject['attendance'] > HIGH_ATTENDANCE:
+            weight *= HIGH_ATTENDANCE_FACTOR
+        return weight
+
+    def _reason(self, subject: Dict[str, Any], skips: int, strategy: str) -> str:
+        if subject['cap'] == 0:
+            return f"No weekly classes listed for {subject['name']}, so no skips are planned."
+
+        parts = [f"{skips} of at most {subject['cap']} skips ({subject['weeklyClasses']} classes/week × {WEEKS_CAP})"]
+        if subject['attendance'] < LOW_ATTENDANCE:
+            parts.append(f"attendance is {subject['attendance']:.2f}%, below {LOW_ATTENDANCE}%, so skips are kept low")
+        elif subject['attendance'] > HIGH_ATTENDANCE:
+            parts.append(f"attendance is {subject['attendance']:.2f}%, above {HIGH_ATTENDANCE}%, so it can take more")
+        else:
+            parts.append(f"attendance is {subject['attendance']:.2f}%")
+
+        if strategy in ('priority', 'balanced'):
+            parts.append(f"{subject['priority']} priority")
+        if skips == subject['cap']:
+            parts.append("capped at one month of classes")
+        return "; ".join(parts) + "."
+
+    def _summary(self, subjects: List[Dict[str, Any]], allowed_skips: int, assigned: int, strategy: str) -> str:
+        summary = f"Distributed {assigned} of {allowed_skips} skips with the '{strategy}' strategy."
+        if assigned < allowed_skips:
+            summary += (f" The other {allowed_skips - assigned} could not be placed without going past "
+                        f"a month of classes in a subject.")
+
+        low = [subject['name'] for subject in subjects if subject['attendance'] < LOW_ATTENDANCE]
+        if low:
+            summary += f" Subjects below {LOW_ATTENDANCE}% ({', '.join(low)}) get fewer skips."
+        return summary